@@ -0,0 +1,256 @@
+import hashlib
+import json
+import re
+from collections import Counter
+from functools import lru_cache
+import tiktoken
+from django.conf import settings
+from django.db import transaction
+from apps.videos.models import VideoAnalysis
+from apps.videos.tagging import normalize_tag_names, set_video_tags
+
+# Bump when the chunk prompt changes, so cached chunk analyses are not reused
+CHUNK_PROMPT_VERSION = 1
+
+# Token size estimate when the tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4
+
+SENTIMENTS = [value for value, _ in VideoAnalysis.SENTIMENT_CHOICES]
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+class CharEncoding:
+    """Stand-in for the tokenizer: a "token" is CHARS_PER_TOKEN characters
+
+    tiktoken downloads its vocabulary on first use (the Docker image
+    bakes it into TIKTOKEN_CACHE_DIR); without network or cache, chunks
+    are sized with this estimate instead of failing the analysis.
+    """
+
+    def encode(self, text, disallowed_special=()):
+        return [text[start:start + CHARS_PER_TOKEN] for start in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def decode(self, tokens):
+        return ''.join(tokens)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # gpt-3.5-turbo's tokenizer; close enough to size Gemini prompts too
+    try:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return CharEncoding()
+
+
+def count_tokens(text):
+    """Number of model tokens in text"""
+    return len(_encoding().encode(text or '', disallowed_special=()))
+
+
+def split_transcript(text, max_tokens=None):
+    """Split a transcript into chunks of at most max_tokens, at sentence ends
+
+    Cut points are content-defined: after the first quarter of a chunk, a
+    sentence closes it when its hash falls under a threshold proportional
+    to its length, so chunks average about three quarters of max_tokens.
+    An edit then only changes the chunks around it; the boundaries before
+    and after stay where they were, and so do their cached analyses.
+    """
+    max_tokens = max_tokens or settings.ANALYSIS_CHUNK_TOKENS
+    min_tokens = max_tokens // 4
+    # Expected tokens between min_tokens and a content-defined cut
+    cut_interval = max_tokens // 2
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence, tokens in _sentences(text, max_tokens):
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(' '.join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+        if current_tokens >= min_tokens and _cuts_after(sentence, tokens, cut_interval):
+            chunks.append(' '.join(current))
+            current, current_tokens = [], 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def chunk_key(chunk, provider):
+    """Cache key of the analysis of one transcript chunk"""
+    payload = json.dumps([chunk, provider, CHUNK_PROMPT_VERSION])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def analysis_prompt(transcription):
+    """Content analysis prompt of a transcription"""
+    return f"""
+        Analyze the following video transcription and provide:
+        1. A brief summary (max 100 words)
+        2. 5-10 relevant tags
+        3. Main topics discussed
+        4. Sentiment analysis (positive, negative, neutral)
+
+        Transcription: {transcription}
+
+        Please format your response as JSON with keys: summary, tags, topics, sentiment
+        """
+
+
+def chunk_prompt(chunk, index, count):
+    """Analysis prompt of one chunk of a long transcription (map step)"""
+    return f"""
+        The following is part {index} of {count} of a video transcription.
+        Analyze this part only and provide:
+        1. A brief summary (max 60 words)
+        2. Up to 10 relevant tags
+        3. Main topics discussed
+        4. Sentiment analysis (positive, negative, neutral)
+
+        Transcription part: {chunk}
+
+        Please format your response as JSON with keys: summary, tags, topics, sentiment
+        """
+
+
+def reduce_prompt(partials):
+    """Prompt combining the chunk summaries into one summary (reduce step)"""
+    summaries = '\n'.join(
+        f"{index}. {partial['summary']}" for index, partial in enumerate(partials, start=1)
+    )
+    return f"""
+        The following are summaries of consecutive parts of one video transcription.
+        Write a brief summary of the whole video (max 100 words).
+
+        Summaries:
+        {summaries}
+
+        Please format your response as JSON with key: summary
+        """
+
+
+def parse_analysis(text):
+    """Analysis dict (summary, tags, topics, sentiment) from a model answer
+
+    Tolerates Markdown code fences and text around the JSON object; an
+    answer without usable JSON becomes the summary.
+    """
+    data = _json_object(text)
+    if data is None:
+        data = {'summary': (text or '').strip()}
+    return _analysis_fields(data)
+
+
+def load_analysis(text):
+    """Validated analysis dict of a final model answer
+
+    Stricter than parse_analysis(): raises ValueError when the answer has
+    no JSON object or no summary. Tags come back normalized (see
+    apps.videos.tagging) and at most ANALYSIS_MAX_TAGS of them.
+    """
+    data = _json_object(text)
+    if data is None:
+        raise ValueError("Analysis is not a JSON object")
+
+    analysis = _analysis_fields(data)
+    if not analysis['summary']:
+        raise ValueError("Analysis has no summary")
+    analysis['tags'] = normalize_tag_names(analysis['tags'])[:settings.ANALYSIS_MAX_TAGS]
+    analysis['topics'] = analysis['topics'][:settings.ANALYSIS_MAX_TOPICS]
+    return analysis
+
+
+def save_video_analysis(video, analysis, provider):
+    """Store a load_analysis() result as the video's analysis and add its tags"""
+    with transaction.atomic():
+        VideoAnalysis.objects.update_or_create(
+            video=video,
+            defaults={
+                'summary': analysis['summary'],
+                'topics': analysis['topics'],
+                'sentiment': analysis['sentiment'],
+                'provider': provider,
+            }
+        )
+        set_video_tags(video, analysis['tags'], replace=False)
+
+
+def merge_analyses(partials, weights, summary):
+    """Combine chunk analyses into the analysis of the whole transcript
+
+    Tags and topics are ranked by the number of chunks naming them; the
+    sentiment is the one covering most tokens.
+    """
+    return {
+        'summary': summary,
+        'tags': _most_common([partial['tags'] for partial in partials], settings.ANALYSIS_MAX_TAGS),
+        'topics': _most_common([partial['topics'] for partial in partials], settings.ANALYSIS_MAX_TOPICS),
+        'sentiment': _weighted_sentiment(partials, weights),
+    }
+
+
+def _sentences(text, max_tokens):
+    """(sentence, token count) pairs of text, sentences longer than max_tokens cut into slices"""
+    encoding = _encoding()
+    for sentence in _SENTENCE_END.split(text.strip()):
+        tokens = encoding.encode(sentence, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            yield sentence, len(tokens)
+            continue
+        for start in range(0, len(tokens), max_tokens):
+            piece = tokens[start:start + max_tokens]
+            yield encoding.decode(piece), len(piece)
+
+
+def _cuts_after(sentence, tokens, cut_interval):
+    digest = int.from_bytes(hashlib.blake2b(sentence.encode(), digest_size=4).digest(), 'big')
+    return digest / 2 ** 32 < min(tokens / cut_interval, 1.0)
+
+
+def _json_object(text):
+    match = _JSON_OBJECT.search(text or '')
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _analysis_fields(data):
+    sentiment = str(data.get('sentiment') or '').strip().lower()
+    return {
+        'summary': str(data.get('summary') or '').strip(),
+        'tags': _string_list(data.get('tags')),
+        'topics': _string_list(data.get('topics')),
+        'sentiment': sentiment if sentiment in SENTIMENTS else 'neutral',
+    }
+
+
+def _string_list(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _most_common(lists, limit):
+    counts = Counter()
+    spelling = {}
+    for items in lists:
+        for normalized, original in {item.lower(): item for item in items}.items():
+            counts[normalized] += 1
+            spelling.setdefault(normalized, original)
+    return [spelling[normalized] for normalized, _ in counts.most_common(limit)]
+
+
+def _weighted_sentiment(partials, weights):
+    totals = Counter()
+    for partial, weight in zip(partials, weights):
+        totals[partial['sentiment']] += weight
+    return totals.most_common(1)[0][0] if totals else 'neutral'
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import google.generativeai as genai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from apps.videos.workspace import ScratchSpace
+from .analysis import (
+    analysis_prompt, chunk_key, chunk_prompt, count_tokens, merge_analyses, parse_analysis, reduce_prompt,
+    split_transcript
+)
+from .cache import fingerprint_audio
+from .chunking import load_pcm, split_audio
+from .clients import create_async_groq_client, create_async_openai_client, gemini_request_options
+from .local_engine import local_engine_configured
+from .routing import get_router
+from .services import (
+    TRANSCRIPTION_MODELS, ContentAnalysisService, TranscriptionService, _analyzed_chunks, _answered_by,
+    _join_answers, _parse_verbose_transcript
+)
+
+
+class AsyncTranscriptionService(TranscriptionService):
+    """asyncio variant of TranscriptionService
+
+    Provider requests are awaited on async clients, so one event loop keeps
+    many of them in flight without a thread each; at most `concurrency`
+    requests run at once. ffmpeg work and cache queries run in threads.
+    The clients belong to the running loop, so use it as a context manager
+    inside that loop:
+
+        async with AsyncTranscriptionService() as service:
+            await service.transcribe_video(path)
+    """
+
+    def __init__(self, concurrency=None):
+        super().__init__()
+        self.concurrency = concurrency or settings.AI_BATCH_CONCURRENCY
+        self.requests = None
+
+    async def __aenter__(self):
+        self.openai_client = create_async_openai_client()
+        self.groq_client = create_async_groq_client()
+        self.requests = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await _close_clients(self.openai_client, self.groq_client)
+        return False
+
+    async def transcribe_video(self, video_path, provider='openai'):
+        """Transcribe video using specified AI provider"""
+        return (await self.video_transcript(video_path, provider))['text']
+
+    async def video_transcript(self, video_path, provider='openai'):
+        """Transcript of a video with segment and word timestamps"""
+        with ScratchSpace('transcription') as scratch:
+            audio_path = await asyncio.to_thread(self._extract_audio, video_path, scratch.path)
+            scratch.check_quota()
+            return await self.transcribe(audio_path, provider)
+
+    async def transcribe_audio(self, audio_path, provider='openai'):
+        """Transcribe an already extracted audio file using specified AI provider"""
+        return (await self.transcribe(audio_path, provider))['text']
+
+    async def transcribe(self, audio_path, provider='openai'):
+        """Transcript of an audio file with segment timestamps, see TranscriptionService.transcribe"""
+        samples = await asyncio.to_thread(load_pcm, audio_path)
+        options = self._transcription_options()
+        audio_hash = None
+        model = self._transcription_model(provider)
+        if model:
+            audio_hash = await asyncio.to_thread(fingerprint_audio, samples)
+            cached = await sync_to_async(self.cache.get)(self.cache.make_key(audio_hash, provider, model, options))
+            if cached is not None:
+                return cached
+
+        with ScratchSpace('transcription-chunks') as scratch:
+            chunks = await asyncio.to_thread(split_audio, audio_path, scratch.path, samples)
+            answers = await asyncio.gather(*[self._transcribe_file(path, provider) for path, _ in chunks])
+        transcript = _join_answers(chunks, answers)
+
+        # Cached under the provider that answered, see TranscriptionService.transcribe
+        answered = _answered_by(answers)
+        answered_model = self._transcription_model(answered)
+        if answered_model:
+            audio_hash = audio_hash or await asyncio.to_thread(fingerprint_audio, samples)
+            cache_key = self.cache.make_key(audio_hash, answered, answered_model, options)
+            await sync_to_async(self.cache.set)(cache_key, transcript, audio_hash, answered, answered_model, options)
+        return transcript
+
+    async def _transcribe_file(self, audio_path, provider):
+        """Transcribe one audio file, on provider or the best healthy fallback
+
+        Returns (provider that answered, transcript).
+        """
+        return await get_router('transcription').acall(
+            self._transcription_providers(provider),
+            lambda candidate: self._answer_with(audio_path, candidate),
+            preferred=provider
+        )
+
+    async def _answer_with(self, audio_path, provider):
+        return provider, await self._transcribe_with(audio_path, provider)
+
+    async def _transcribe_with(self, audio_path, provider):
+        """Transcribe one audio file (one provider request)"""
+        async with self.requests:
+            if provider == 'openai' and self.openai_client:
+                return await self._transcribe_with_openai(audio_path)
+            elif provider == 'groq' and self.groq_client:
+                return await self._transcribe_with_groq(audio_path)
+            elif provider == 'gemini' and self.gemini_configured:
+                return await asyncio.to_thread(super()._transcribe_with_gemini, audio_path)
+            elif provider == 'local' and local_engine_configured():
+                # CPU inference: runs in a thread, off the event loop
+                return await asyncio.to_thread(self._transcribe_with_local, audio_path)
+            else:
+                raise ValueError(f"Provider {provider} not available or not configured")
+
+    async def _transcribe_with_openai(self, audio_path):
+        """Transcribe using OpenAI Whisper"""
+        with open(audio_path, 'rb') as audio_file:
+            transcript = await self.openai_client.audio.transcriptions.create(
+                model=TRANSCRIPTION_MODELS['openai'],
+                file=audio_file,
+                response_format="verbose_json",
+                timestamp_granularities=["word", "segment"]
+            )
+        return _parse_verbose_transcript(transcript)
+
+    async def _transcribe_with_groq(self, audio_path):
+        """Transcribe using Groq"""
+        with open(audio_path, 'rb') as audio_file:
+            transcript = await self.groq_client.audio.transcriptions.create(
+                file=(audio_path, audio_file.read()),
+                model=TRANSCRIPTION_MODELS['groq'],
+                response_format="verbose_json",
+                extra_body={'timestamp_granularities': ["word", "segment"]}
+            )
+        return _parse_verbose_transcript(transcript)
+
+
+class AsyncContentAnalysisService(ContentAnalysisService):
+    """asyncio variant of ContentAnalysisService, see AsyncTranscriptionService"""
+
+    def __init__(self, concurrency=None):
+        super().__init__()
+        self.concurrency = concurrency or settings.AI_BATCH_CONCURRENCY
+        self.requests = None
+
+    async def __aenter__(self):
+        self.openai_client = create_async_openai_client()
+        self.requests = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await _close_clients(self.openai_client)
+        return False
+
+    async def analyze_content(self, transcription, provider='openai'):
+        """Analyze content and generate tags, summary, etc., see ContentAnalysisService"""
+        if count_tokens(transcription) <= settings.ANALYSIS_CHUNK_TOKENS:
+            return (await self._request(analysis_prompt(transcription), provider))[1]
+        return await self._analyze_chunked(transcription, provider)
+
+    async def _analyze_chunked(self, transcription, provider):
+        """Map-reduce analysis of a long transcript, see ContentAnalysisService"""
+        chunks = await asyncio.to_thread(split_transcript, transcription)
+        keys = [chunk_key(chunk, provider) for chunk in chunks]
+        partials = await sync_to_async(self.cache.get_many)(keys)
+
+        missing = [index for index, key in enumerate(keys) if key not in partials]
+        answers = await asyncio.gather(*[
+            self._request(chunk_prompt(chunks[index], index + 1, len(chunks)), provider)
+            for index in missing
+        ])
+        analyzed, entries = _analyzed_chunks(chunks, missing, answers)
+        for answered, results in entries.items():
+            await sync_to_async(self.cache.set_many)(results, answered)
+
+        ordered = [analyzed[index] if index in analyzed else partials[key] for index, key in enumerate(keys)]
+        summary = parse_analysis((await self._request(reduce_prompt(ordered), provider))[1])['summary']
+        return json.dumps(merge_analyses(ordered, [count_tokens(chunk) for chunk in chunks], summary))
+
+    async def _request(self, prompt, provider):
+        """Send one analysis prompt, on provider or the best healthy fallback
+
+        Returns (provider that answered, response text).
+        """
+        configured = {
+            'openai': self.openai_client is not None,
+            'gemini': self.gemini_configured,
+        }
+        if provider not in configured:
+            raise ValueError(f"Provider {provider} not available")
+        return await get_router('analysis').acall(
+            [name for name, available in configured.items() if available],
+            lambda candidate: self._answer_with(prompt, candidate),
+            preferred=provider
+        )
+
+    async def _answer_with(self, prompt, provider):
+        return provider, await self._analyze_with(prompt, provider)
+
+    async def _analyze_with(self, prompt, provider):
+        """Send an analysis prompt to one provider (one request)"""
+        async with self.requests:
+            if provider == 'openai' and self.openai_client:
+                return await self._analyze_with_openai(prompt)
+            elif provider == 'gemini' and self.gemini_configured:
+                return await self._analyze_with_gemini(prompt)
+            else:
+                raise ValueError(f"Provider {provider} not available")
+
+    async def _analyze_with_openai(self, prompt):
+        """Analyze content using OpenAI GPT"""
+        response = await self.openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3
+        )
+        return response.choices[0].message.content
+
+    async def _analyze_with_gemini(self, prompt):
+        """Analyze content using Google Gemini"""
+        model = genai.GenerativeModel('gemini-pro')
+        response = await model.generate_content_async(
+            prompt,
+            request_options=gemini_request_options(asynchronous=True)
+        )
+        return response.text
+
+
+async def _close_clients(*clients):
+    for client in clients:
+        if client is not None:
+            await client.close()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from apps.videos.transcripts import pack_transcript, unpack_items
+from .models import AnalysisCacheEntry, TranscriptionCacheEntry
+
+
+def fingerprint_audio(samples):
+    """SHA-256 of decoded PCM samples
+
+    Hashing the decoded audio rather than the file makes re-encodes and
+    re-muxes of the same audio (re-uploads, YouTube re-downloads) match.
+    """
+    return hashlib.sha256(samples.tobytes()).hexdigest()
+
+
+class TranscriptionCache:
+    """Size-bounded LRU cache of transcripts in the database"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.TRANSCRIPTION_CACHE_MAX_BYTES
+
+    @staticmethod
+    def make_key(audio_hash, provider, model, options):
+        """Cache key of one (audio, provider, model, options) combination"""
+        payload = json.dumps([audio_hash, provider, model, options], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """Cached transcript ({'text', 'segments', 'words'}) or None"""
+        if not self.max_bytes:
+            return None
+        entry = TranscriptionCacheEntry.objects.filter(key=key).only(
+            'text', 'segment_text', 'segment_times', 'word_text', 'word_times'
+        ).first()
+        if entry is None:
+            return None
+
+        TranscriptionCacheEntry.objects.filter(id=entry.id).update(
+            hits=F('hits') + 1,
+            last_used_at=timezone.now()
+        )
+        return {
+            'text': entry.text,
+            'segments': unpack_items(entry.segment_text, entry.segment_times, 'text'),
+            'words': unpack_items(entry.word_text, entry.word_times, 'word'),
+        }
+
+    def set(self, key, transcript, audio_hash, provider, model, options):
+        """Store a transcript, then evict least recently used entries over the size limit"""
+        if not self.max_bytes:
+            return
+        columns = pack_transcript(transcript)
+        size = len(transcript['text'].encode()) + sum(
+            len(value.encode()) if isinstance(value, str) else len(value) for value in columns.values()
+        )
+        TranscriptionCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'audio_hash': audio_hash,
+                'provider': provider,
+                'model': model,
+                'options': options,
+                'text': transcript['text'],
+                **columns,
+                'size': size,
+                'last_used_at': timezone.now(),
+            }
+        )
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        _evict(TranscriptionCacheEntry, self.max_bytes)
+
+
+class AnalysisCache:
+    """Size-bounded LRU cache of transcript chunk analyses in the database"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.ANALYSIS_CACHE_MAX_BYTES
+
+    def get_many(self, keys):
+        """Cached analyses of the given keys, as {key: analysis}"""
+        if not self.max_bytes or not keys:
+            return {}
+        entries = dict(AnalysisCacheEntry.objects.filter(key__in=keys).values_list('key', 'result'))
+        if entries:
+            AnalysisCacheEntry.objects.filter(key__in=entries).update(
+                hits=F('hits') + 1,
+                last_used_at=timezone.now()
+            )
+        return entries
+
+    def set_many(self, results, provider):
+        """Store {key: analysis}, then evict least recently used entries over the size limit"""
+        if not self.max_bytes or not results:
+            return
+        now = timezone.now()
+        AnalysisCacheEntry.objects.bulk_create(
+            [
+                AnalysisCacheEntry(
+                    key=key,
+                    provider=provider,
+                    result=result,
+                    size=len(json.dumps(result)),
+                    last_used_at=now,
+                )
+                for key, result in results.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['provider', 'result', 'size', 'last_used_at'],
+        )
+        _evict(AnalysisCacheEntry, self.max_bytes)
+
+
+def _evict(model, max_bytes):
+    total = model.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total <= max_bytes:
+        return
+
+    stale = []
+    for entry_id, size in model.objects.order_by('last_used_at').values_list('id', 'size').iterator():
+        if total <= max_bytes:
+            break
+        stale.append(entry_id)
+        total -= size
+    model.objects.filter(id__in=stale).delete()
@@ -0,0 +1,125 @@
+import os
+import subprocess
+import numpy as np
+from django.conf import settings
+from apps.videos.media import MediaProcessingError, speech_audio_args
+
+# RMS analysis resolution and the smoothing applied before looking for
+# silences (so a single quiet frame inside a word is not a "gap")
+FRAME_DURATION = 0.03  # seconds
+SMOOTHING_DURATION = 0.3  # seconds
+
+
+def load_pcm(audio_path, sample_rate=None):
+    """Decode an audio file to a mono int16 NumPy array at sample_rate"""
+    sample_rate = sample_rate or settings.TRANSCRIPTION_SAMPLE_RATE
+    command = [
+        settings.FFMPEG_BINARY, '-nostdin', '-v', 'error',
+        '-i', audio_path,
+        '-map', '0:a:0',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 's16le',
+        'pipe:1',
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise MediaProcessingError(result.stderr.decode(errors='replace').strip() or f"ffmpeg failed on {audio_path}")
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def frame_rms(samples, sample_rate):
+    """RMS level of every FRAME_DURATION frame, smoothed over SMOOTHING_DURATION"""
+    frame = max(int(sample_rate * FRAME_DURATION), 1)
+    count = len(samples) // frame
+    frames = samples[:count * frame].astype(np.float32).reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+
+    width = max(int(SMOOTHING_DURATION / FRAME_DURATION), 1)
+    return np.convolve(rms, np.ones(width, dtype=np.float32) / width, mode='same')
+
+
+def find_split_points(samples, sample_rate, chunk_duration=None, search_window=None):
+    """Sample offsets where the audio should be cut into chunks
+
+    Every chunk is at most chunk_duration long: each cut is placed at the
+    quietest point of the last search_window seconds before that limit,
+    so cuts fall into pauses between words rather than inside them.
+    """
+    chunk_duration = chunk_duration or settings.TRANSCRIPTION_CHUNK_DURATION
+    search_window = search_window or settings.TRANSCRIPTION_SPLIT_WINDOW
+    if len(samples) <= chunk_duration * sample_rate:
+        return []
+
+    rms = frame_rms(samples, sample_rate)
+    frame = max(int(sample_rate * FRAME_DURATION), 1)
+    chunk_frames = int(chunk_duration / FRAME_DURATION)
+    window_frames = max(min(int(search_window / FRAME_DURATION), chunk_frames - 1), 1)
+
+    points = []
+    start = 0
+    while len(rms) - start > chunk_frames:
+        window_start = start + chunk_frames - window_frames
+        quietest = window_start + int(np.argmin(rms[window_start:start + chunk_frames]))
+        points.append(quietest * frame)
+        start = quietest
+    return points
+
+
+def split_audio(audio_path, output_dir, samples=None):
+    """Cut an audio file at silences into chunks of speech audio
+
+    samples: the file already decoded by load_pcm(), if at hand. Returns
+    (chunk path, start offset in seconds) pairs in order; a short file
+    comes back as a single chunk, unchanged.
+    """
+    sample_rate = settings.TRANSCRIPTION_SAMPLE_RATE
+    if samples is None:
+        samples = load_pcm(audio_path, sample_rate)
+    points = find_split_points(samples, sample_rate)
+    if not points:
+        return [(audio_path, 0.0)]
+
+    # Chunks are encoded from the decoded samples: cutting the compressed
+    # file directly could only cut at packet boundaries
+    audio_args, extension = speech_audio_args(trim_silence=False)
+    bounds = [0, *points, len(samples)]
+    chunks = []
+    for index, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        chunk_path = os.path.join(output_dir, f'chunk_{index:03d}.{extension}')
+        command = [
+            settings.FFMPEG_BINARY, '-y', '-v', 'error',
+            '-f', 's16le', '-ar', str(sample_rate), '-ac', '1',
+            '-i', 'pipe:0',
+            *audio_args,
+            chunk_path,
+        ]
+        result = subprocess.run(command, input=samples[start:end].tobytes(), capture_output=True)
+        if result.returncode != 0:
+            raise MediaProcessingError(result.stderr.decode(errors='replace').strip() or "ffmpeg failed on audio chunk")
+        chunks.append((chunk_path, start / sample_rate))
+    return chunks
+
+
+def stitch_transcripts(results):
+    """Join per-chunk transcripts, shifting segment and word timestamps by each chunk's offset
+
+    results: (offset in seconds, {'text': ..., 'segments': [...], 'words': [...]}) pairs
+    """
+    texts = []
+    segments = []
+    words = []
+    for offset, result in results:
+        text = (result.get('text') or '').strip()
+        if text:
+            texts.append(text)
+        segments.extend(_shifted(result.get('segments'), offset))
+        words.extend(_shifted(result.get('words'), offset))
+    return {'text': ' '.join(texts), 'segments': segments, 'words': words}
+
+
+def _shifted(items, offset):
+    return [
+        {**item, 'start': round(item['start'] + offset, 3), 'end': round(item['end'] + offset, 3)}
+        for item in items or []
+    ]
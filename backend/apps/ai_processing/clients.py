@@ -0,0 +1,147 @@
+import threading
+import httpx
+import openai
+import google.generativeai as genai
+from google.api_core import retry as api_retry, retry_async
+from groq import AsyncGroq, Groq
+from django.conf import settings
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Process-wide OpenAI client (None when no API key is configured)"""
+    return _get('openai', _create_openai_client)
+
+
+def get_groq_client():
+    """Process-wide Groq client (None when no API key is configured)"""
+    return _get('groq', _create_groq_client)
+
+
+def configure_gemini():
+    """Configure the Gemini SDK once per process; True when an API key is set"""
+    return _get('gemini', _configure_gemini)
+
+
+def gemini_request_options(asynchronous=False):
+    """Timeout and retry policy for Gemini requests (its SDK takes them per call)"""
+    options = settings.AI_PROVIDER_CLIENTS['gemini']
+    retry_class = retry_async.AsyncRetry if asynchronous else api_retry.Retry
+    return {
+        'timeout': options['timeout'],
+        'retry': retry_class(timeout=options['timeout'] * (options['max_retries'] + 1)),
+    }
+
+
+def create_async_openai_client():
+    """New asyncio OpenAI client (None without an API key)
+
+    Async connection pools belong to one event loop, so unlike the sync
+    clients these are created per loop and closed by their owner.
+    """
+    if not settings.OPENAI_API_KEY:
+        return None
+    options = settings.AI_PROVIDER_CLIENTS['openai']
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=options['base_url'],
+        timeout=options['timeout'],
+        max_retries=options['max_retries'],
+        http_client=_async_http_client('openai'),
+    )
+
+
+def create_async_groq_client():
+    """New asyncio Groq client (None without an API key), see create_async_openai_client"""
+    if not settings.GROQ_API_KEY:
+        return None
+    options = settings.AI_PROVIDER_CLIENTS['groq']
+    return AsyncGroq(
+        api_key=settings.GROQ_API_KEY,
+        base_url=options['base_url'],
+        timeout=options['timeout'],
+        max_retries=options['max_retries'],
+        http_client=_async_http_client('groq'),
+    )
+
+
+def init_clients():
+    """Create every configured client up front (called when a worker process starts)"""
+    get_openai_client()
+    get_groq_client()
+    configure_gemini()
+
+
+def reset_clients():
+    """Forget the clients inherited from a parent process
+
+    They are not closed: their sockets still belong to the parent.
+    """
+    with _lock:
+        _clients.clear()
+
+
+def _get(name, factory):
+    if name not in _clients:
+        with _lock:
+            if name not in _clients:
+                _clients[name] = factory()
+    return _clients[name]
+
+
+def _http_client(provider):
+    """Keep-alive HTTP connection pool sized for one provider
+
+    Shared by every request of the process, so TLS handshakes only happen
+    when a connection is opened, not on every call.
+    """
+    options = settings.AI_PROVIDER_CLIENTS[provider]
+    return httpx.Client(timeout=options['timeout'], limits=_pool_limits(options))
+
+
+def _async_http_client(provider):
+    options = settings.AI_PROVIDER_CLIENTS[provider]
+    return httpx.AsyncClient(timeout=options['timeout'], limits=_pool_limits(options))
+
+
+def _pool_limits(options):
+    return httpx.Limits(
+        max_connections=options['pool_size'],
+        max_keepalive_connections=options['pool_size'],
+        keepalive_expiry=options['keepalive_expiry'],
+    )
+
+
+def _create_openai_client():
+    if not settings.OPENAI_API_KEY:
+        return None
+    options = settings.AI_PROVIDER_CLIENTS['openai']
+    return openai.OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=options['base_url'],
+        timeout=options['timeout'],
+        max_retries=options['max_retries'],
+        http_client=_http_client('openai'),
+    )
+
+
+def _create_groq_client():
+    if not settings.GROQ_API_KEY:
+        return None
+    options = settings.AI_PROVIDER_CLIENTS['groq']
+    return Groq(
+        api_key=settings.GROQ_API_KEY,
+        base_url=options['base_url'],
+        timeout=options['timeout'],
+        max_retries=options['max_retries'],
+        http_client=_http_client('groq'),
+    )
+
+
+def _configure_gemini():
+    if not settings.GEMINI_API_KEY:
+        return False
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    return True
@@ -0,0 +1,98 @@
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_TRANSCRIPT = "This is a fake transcription from the local provider."
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """Offline stand-in for the OpenAI-compatible provider APIs
+
+    Serves audio transcriptions and chat completions in the shapes the
+    OpenAI and Groq SDKs expect, after latency (+/- jitter) seconds, and
+    fails a share of requests (error_rate) with status error_status, so
+    routing, hedging and circuit breakers can be exercised without the
+    real APIs. Set OPENAI_BASE_URL to http://host:port/v1 and
+    GROQ_BASE_URL to http://host:port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, jitter=0.0, error_rate=0.0, error_status=503):
+        super().__init__(address, FakeProviderHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        # The body (audio upload or prompt) is read and ignored
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.requests += 1
+
+        delay = self.server.latency + random.uniform(-self.server.jitter, self.server.jitter)
+        time.sleep(max(delay, 0))
+
+        if random.random() < self.server.error_rate:
+            return self._send(self.server.error_status, {
+                'error': {'message': 'Fake provider failure', 'type': 'server_error'}
+            })
+
+        if self.path.endswith('/audio/transcriptions'):
+            return self._send(200, _transcription())
+        if self.path.endswith('/chat/completions'):
+            return self._send(200, _chat_completion())
+        return self._send(404, {'error': {'message': f"Unknown endpoint {self.path}"}})
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _transcription():
+    words = FAKE_TRANSCRIPT.split()
+    return {
+        'task': 'transcribe',
+        'language': 'english',
+        'duration': len(words) * 0.4,
+        'text': FAKE_TRANSCRIPT,
+        'segments': [{'id': 0, 'start': 0.0, 'end': len(words) * 0.4, 'text': FAKE_TRANSCRIPT}],
+        'words': [
+            {'word': word, 'start': round(index * 0.4, 2), 'end': round(index * 0.4 + 0.35, 2)}
+            for index, word in enumerate(words)
+        ],
+    }
+
+
+def _chat_completion():
+    analysis = {
+        'summary': 'A fake summary from the local provider.',
+        'tags': ['fake', 'offline', 'test'],
+        'topics': ['testing'],
+        'sentiment': 'neutral',
+    }
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': 'fake',
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': json.dumps(analysis)},
+            'finish_reason': 'stop',
+        }],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+    }
@@ -0,0 +1,135 @@
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .chunking import load_pcm
+
+_engine = None
+_lock = threading.Lock()
+
+STUB_TRANSCRIPT = "This is a stub transcription from the local engine."
+
+
+class LocalEngine:
+    """Speech-to-text model running inside the worker process
+
+    transcribe() returns the same {'text', 'segments', 'words'} dict as the
+    remote providers (see services._parse_verbose_transcript).
+    """
+
+    name = None
+
+    def __init__(self, options):
+        self.options = options
+
+    def transcribe(self, audio_path):
+        raise NotImplementedError
+
+
+class FasterWhisperEngine(LocalEngine):
+    """Whisper on CTranslate2 (faster-whisper), int8 on the CPU by default"""
+
+    name = 'faster-whisper'
+
+    def __init__(self, options):
+        super().__init__(options)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImproperlyConfigured("LOCAL_TRANSCRIPTION_ENGINE=faster-whisper needs `pip install faster-whisper`")
+
+        self.model = WhisperModel(
+            options['model'],
+            device=options['device'],
+            compute_type=options['compute_type'],
+            cpu_threads=options['cpu_threads'],
+            num_workers=options['num_workers'],
+            download_root=options['download_root'],
+        )
+
+    def transcribe(self, audio_path):
+        segments, info = self.model.transcribe(
+            audio_path,
+            beam_size=self.options['beam_size'],
+            word_timestamps=True,
+            vad_filter=False,  # audio is already cut at silences
+        )
+        # segments is a generator: decoding happens while iterating
+        segments = list(segments)
+        return {
+            'text': ''.join(segment.text for segment in segments).strip(),
+            'segments': [
+                {'start': float(segment.start), 'end': float(segment.end), 'text': segment.text.strip()}
+                for segment in segments
+            ],
+            'words': [
+                {'word': word.word.strip(), 'start': float(word.start), 'end': float(word.end)}
+                for segment in segments
+                for word in segment.words or []
+            ],
+        }
+
+
+class StubEngine(LocalEngine):
+    """Tiny stand-in model: spreads a fixed sentence over the audio duration
+
+    Loads instantly and needs no model files, for development and tests.
+    """
+
+    name = 'stub'
+
+    def transcribe(self, audio_path):
+        duration = len(load_pcm(audio_path)) / settings.TRANSCRIPTION_SAMPLE_RATE
+        words = STUB_TRANSCRIPT.split()
+        step = duration / len(words) if duration else 0.0
+        return {
+            'text': STUB_TRANSCRIPT,
+            'segments': [{'start': 0.0, 'end': round(duration, 3), 'text': STUB_TRANSCRIPT}],
+            'words': [
+                {'word': word, 'start': round(index * step, 3), 'end': round((index + 1) * step, 3)}
+                for index, word in enumerate(words)
+            ],
+        }
+
+
+ENGINES = {
+    FasterWhisperEngine.name: FasterWhisperEngine,
+    StubEngine.name: StubEngine,
+}
+
+
+def local_engine_configured():
+    return bool(settings.LOCAL_TRANSCRIPTION['engine'])
+
+
+def local_model_name():
+    """Engine and model identifier (part of the transcription cache key)"""
+    options = settings.LOCAL_TRANSCRIPTION
+    return f"{options['engine']}:{options['model']}"
+
+
+def get_local_engine():
+    """Process-wide local engine, loaded on first use (None when not configured)
+
+    Workers load it when their process starts (see config/celery.py), so
+    the first request does not pay for loading the model.
+    """
+    global _engine
+    if _engine is None and local_engine_configured():
+        with _lock:
+            if _engine is None:
+                _engine = _load_engine()
+    return _engine
+
+
+def reset_local_engine():
+    """Forget the engine inherited from a parent process"""
+    global _engine
+    with _lock:
+        _engine = None
+
+
+def _load_engine():
+    options = settings.LOCAL_TRANSCRIPTION
+    if options['engine'] not in ENGINES:
+        raise ImproperlyConfigured(f"Unknown LOCAL_TRANSCRIPTION_ENGINE: {options['engine']}")
+    return ENGINES[options['engine']](options)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from apps.ai_processing.fake_provider import FakeProviderServer
+
+
+class Command(BaseCommand):
+    help = "Run a local fake OpenAI-compatible AI provider for offline testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--latency', type=float, default=0.2, help="Seconds per request")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Random +/- seconds on the latency")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests that fail (0-1)")
+        parser.add_argument('--error-status', type=int, default=503)
+
+    def handle(self, *args, **options):
+        server = FakeProviderServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            error_status=options['error_status']
+        )
+        self.stdout.write(f"Fake AI provider on http://{options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class TranscriptionCacheEntry(models.Model):
+    """Transcript of a given audio content by a given provider/model/options
+
+    Looked up before any provider call (see cache.py); least recently used
+    entries are evicted once the cache exceeds TRANSCRIPTION_CACHE_MAX_BYTES.
+    """
+    key = models.CharField(max_length=64, unique=True)  # SHA-256 of hash+provider+model+options
+    audio_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the decoded audio
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=50)
+    options = models.JSONField(default=dict)
+    text = models.TextField()
+    # Segment/word columns as in apps.videos.models.VideoTranscript
+    segment_text = models.TextField(blank=True)
+    segment_times = models.BinaryField(default=bytes)
+    word_text = models.TextField(blank=True)
+    word_times = models.BinaryField(default=bytes)
+    size = models.PositiveIntegerField()  # bytes of text + columns, for eviction
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.provider}/{self.model} - {self.audio_hash[:12]}"
+
+
+class AnalysisCacheEntry(models.Model):
+    """Content analysis of one transcript chunk by a given provider
+
+    Lets a re-analysis of an edited transcript skip its unchanged chunks;
+    evicted like TranscriptionCacheEntry, above ANALYSIS_CACHE_MAX_BYTES.
+    """
+    key = models.CharField(max_length=64, unique=True)  # SHA-256 of chunk+provider+prompt version
+    provider = models.CharField(max_length=20)
+    result = models.JSONField(default=dict)  # summary, tags, topics, sentiment
+    size = models.PositiveIntegerField()  # bytes of result, for eviction
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.provider} - {self.key[:12]}"
@@ -0,0 +1,345 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import groq
+import httpx
+import openai
+from django.conf import settings
+from google.api_core import exceptions as google_exceptions
+
+_routers = {}
+_routers_lock = threading.Lock()
+_pool = None
+
+
+class ProviderUnavailable(Exception):
+    """Raised when no AI provider could serve a request"""
+
+
+def is_provider_fault(error):
+    """Whether a failed request says the provider itself is unhealthy
+
+    Timeouts, connection errors, 5xx and 429 count against the circuit
+    breaker; other errors (4xx, a bad answer, a bug on our side) still
+    fail the request over but do not mark the provider down.
+    """
+    if isinstance(error, (
+        openai.APIConnectionError, groq.APIConnectionError, httpx.TransportError,
+        google_exceptions.RetryError, TimeoutError
+    )):
+        return True
+    # openai/groq APIStatusError and google.api_core's GoogleAPICallError
+    status = getattr(error, 'status_code', None)
+    if status is None and isinstance(error, google_exceptions.GoogleAPICallError):
+        status = error.code
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+class ProviderHealth:
+    """Rolling latency/error statistics and circuit breaker of one provider
+
+    The circuit opens after failure_threshold consecutive failures, or when
+    the error rate over the window reaches error_rate_threshold (failures:
+    see is_provider_fault). While open
+    the provider gets no traffic; after cooldown seconds a single trial
+    request is let through (half-open) and its outcome closes or reopens it.
+    """
+
+    def __init__(self, name, window=None, failure_threshold=None, error_rate_threshold=None, cooldown=None):
+        options = settings.AI_ROUTER
+        self.name = name
+        self.latencies = deque(maxlen=window or options['window'])
+        self.outcomes = deque(maxlen=window or options['window'])
+        self.failure_threshold = failure_threshold or options['failure_threshold']
+        self.error_rate_threshold = error_rate_threshold or options['error_rate_threshold']
+        self.cooldown = cooldown or options['cooldown']
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """True when a request may be sent now (closed, or the half-open trial)"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None and (
+                time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight
+            )
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            failures = self.outcomes.count(False)
+            error_rate = failures / len(self.outcomes)
+            if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold or (
+                len(self.outcomes) >= self.outcomes.maxlen // 2 and error_rate >= self.error_rate_threshold
+            ):
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """Give back a half-open trial whose request was abandoned"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def latency(self, quantile):
+        """Latency quantile over the window in seconds (None without samples)"""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(int(quantile * len(samples)), len(samples) - 1)]
+
+    def snapshot(self):
+        """Current statistics, for monitoring"""
+        with self.lock:
+            outcomes = list(self.outcomes)
+        return {
+            'provider': self.name,
+            'circuit': 'open' if self.is_open() else 'closed',
+            'requests': len(outcomes),
+            'error_rate': round(outcomes.count(False) / len(outcomes), 3) if outcomes else 0.0,
+            'p50': self.latency(0.5),
+            'p95': self.latency(0.95),
+        }
+
+
+class ProviderRouter:
+    """Send each request to the fastest healthy provider, with failover and hedging
+
+    Providers are ordered by rolling median latency (providers without
+    samples first, so they get measured), skipping those whose circuit is
+    open; the preferred provider goes first while it is healthy. When the
+    first provider has not answered after its p95 latency (counted from
+    when its request started running, not from when it was queued), one
+    hedged request goes to the next provider and the first answer wins.
+    Failed requests fall over to the next provider.
+
+    Statistics are kept per worker process.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.health = {}
+        self.lock = threading.Lock()
+
+    def call(self, providers, request, preferred=None):
+        """Run request(provider) on the best provider and return its result
+
+        providers: names of the configured providers able to serve it
+        """
+        queue = self.rank(providers, preferred)
+        if not queue:
+            raise ProviderUnavailable(f"No {self.name} provider available (circuits open or not configured)")
+
+        pool = _get_pool()
+        pending = {}
+        errors = []
+        hedged = not settings.AI_ROUTER['hedging']
+
+        def launch():
+            while queue:
+                provider = queue.pop(0)
+                health = self.get_health(provider)
+                if health.acquire():
+                    started = _StartSignal()
+                    pending[pool.submit(self._timed, health, request, provider, started)] = provider
+                    return provider, started
+            return None
+
+        primary = launch()
+        while pending:
+            hedge_after = None
+            if not hedged and queue and primary:
+                hedge_after = self._hedge_after(*primary)
+            done, _ = wait(pending, timeout=hedge_after, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # The primary is slower than its p95: race a second provider
+                hedged = True
+                launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(f"{provider}: {e}")
+            if not pending:
+                primary = launch()
+
+        raise ProviderUnavailable(f"All {self.name} providers failed: " + '; '.join(errors))
+
+    async def acall(self, providers, request, preferred=None):
+        """asyncio counterpart of call(): request(provider) returns a coroutine
+
+        A hedged request that loses the race is cancelled.
+        """
+        queue = self.rank(providers, preferred)
+        if not queue:
+            raise ProviderUnavailable(f"No {self.name} provider available (circuits open or not configured)")
+
+        pending = {}
+        errors = []
+        hedged = not settings.AI_ROUTER['hedging']
+
+        def launch():
+            while queue:
+                provider = queue.pop(0)
+                health = self.get_health(provider)
+                if health.acquire():
+                    pending[asyncio.ensure_future(self._atimed(health, request, provider))] = provider
+                    return provider
+            return None
+
+        primary = launch()
+        try:
+            while pending:
+                hedge_after = None
+                if not hedged and queue:
+                    hedge_after = self._hedge_delay(primary)
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+
+                for future in done:
+                    provider = pending.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        errors.append(f"{provider}: {e}")
+                if not pending:
+                    primary = launch()
+        finally:
+            for future in pending:
+                future.cancel()
+
+        raise ProviderUnavailable(f"All {self.name} providers failed: " + '; '.join(errors))
+
+    def rank(self, providers, preferred=None):
+        """Healthy providers, fastest first (preferred first while healthy)"""
+        healthy = [provider for provider in providers if not self.get_health(provider).is_open()]
+
+        def median(provider):
+            return self.get_health(provider).latency(0.5) or 0.0
+
+        ranked = sorted(healthy, key=median)
+        if preferred in ranked:
+            ranked.remove(preferred)
+            ranked.insert(0, preferred)
+        return ranked
+
+    def get_health(self, provider):
+        with self.lock:
+            if provider not in self.health:
+                self.health[provider] = ProviderHealth(provider)
+            return self.health[provider]
+
+    def snapshot(self):
+        with self.lock:
+            health = list(self.health.values())
+        return [provider_health.snapshot() for provider_health in health]
+
+    def _hedge_delay(self, provider):
+        health = self.get_health(provider)
+        if len(health.latencies) < settings.AI_ROUTER['hedge_min_samples']:
+            return None
+        return health.latency(settings.AI_ROUTER['hedge_quantile'])
+
+    def _hedge_after(self, provider, started):
+        """Seconds left before hedging provider's request (None: never hedge it)
+
+        Waits for the request to start running: time spent queued for a
+        pool thread is not the provider being slow, and a hedge submitted
+        then would only queue behind it.
+        """
+        delay = self._hedge_delay(provider)
+        if delay is None:
+            return None
+        started.wait()
+        return max(delay - (time.monotonic() - started.at), 0)
+
+    def _timed(self, health, request, provider, started):
+        started.mark()
+        try:
+            result = request(provider)
+        except Exception as e:
+            _record_error(health, e)
+            raise
+        health.record_success(time.monotonic() - started.at)
+        return result
+
+    async def _atimed(self, health, request, provider):
+        started = time.monotonic()
+        try:
+            result = await request(provider)
+        except asyncio.CancelledError:
+            # Lost a hedged race: neither a success nor a failure
+            health.release_trial()
+            raise
+        except Exception as e:
+            _record_error(health, e)
+            raise
+        health.record_success(time.monotonic() - started)
+        return result
+
+
+class _StartSignal(threading.Event):
+    """Set by the pool thread when a request starts running, with the time it did"""
+
+    at = None
+
+    def mark(self):
+        self.at = time.monotonic()
+        self.set()
+
+
+def _record_error(health, error):
+    if is_provider_fault(error):
+        health.record_failure()
+    else:
+        # Not the provider's fault: no outcome, but a half-open trial is over
+        health.release_trial()
+
+
+def get_router(name):
+    """Process-wide router of one kind of request ('transcription', 'analysis')"""
+    with _routers_lock:
+        if name not in _routers:
+            _routers[name] = ProviderRouter(name)
+        return _routers[name]
+
+
+def _get_pool():
+    """Threads running provider requests (shared, so a losing hedge never blocks its caller)"""
+    global _pool
+    with _routers_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.AI_ROUTER['max_threads'],
+                thread_name_prefix='ai-router'
+            )
+        return _pool
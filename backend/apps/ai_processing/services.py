@@ -1,74 +1,179 @@
-import openai
+import json
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
-from groq import Groq
 from django.conf import settings
-import moviepy.editor as mp
-import tempfile
-import os
+from apps.videos.media import extract_speech_audio
+from apps.videos.workspace import ScratchSpace
+from .analysis import (
+    analysis_prompt, chunk_key, chunk_prompt, count_tokens, merge_analyses, parse_analysis, reduce_prompt,
+    split_transcript
+)
+from .cache import AnalysisCache, TranscriptionCache, fingerprint_audio
+from .chunking import load_pcm, split_audio, stitch_transcripts
+from .clients import configure_gemini, gemini_request_options, get_groq_client, get_openai_client
+from .local_engine import get_local_engine, local_engine_configured, local_model_name
+from .routing import get_router
+
+# Model used by each transcription provider (part of the cache key). Gemini
+# is not listed: its transcription is a placeholder and is never cached.
+TRANSCRIPTION_MODELS = {
+    'openai': 'whisper-1',
+    'groq': 'whisper-large-v3',
+}
 
 
 class TranscriptionService:
     """Service for transcribing videos using various AI providers"""
 
     def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
-        self.groq_client = Groq(api_key=settings.GROQ_API_KEY) if settings.GROQ_API_KEY else None
-        
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
+        # Process-wide clients: connections are reused across services
+        self.openai_client = get_openai_client()
+        self.groq_client = get_groq_client()
+        self.gemini_configured = configure_gemini()
+
+        self.cache = TranscriptionCache()
 
     def transcribe_video(self, video_path, provider='openai'):
         """Transcribe video using specified AI provider"""
-        # Extract audio from video
-        audio_path = self._extract_audio(video_path)
-        
-        try:
-            if provider == 'openai' and self.openai_client:
-                return self._transcribe_with_openai(audio_path)
-            elif provider == 'groq' and self.groq_client:
-                return self._transcribe_with_groq(audio_path)
-            elif provider == 'gemini' and settings.GEMINI_API_KEY:
-                return self._transcribe_with_gemini(audio_path)
-            else:
-                raise ValueError(f"Provider {provider} not available or not configured")
-        finally:
-            # Clean up audio file
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-
-    def _extract_audio(self, video_path):
-        """Extract audio from video file"""
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
-            audio_path = temp_audio.name
-
-        with mp.VideoFileClip(video_path) as video:
-            audio = video.audio
-            if audio:
-                audio.write_audiofile(audio_path, verbose=False, logger=None)
+        return self.video_transcript(video_path, provider)['text']
+
+    def video_transcript(self, video_path, provider='openai'):
+        """Transcript of a video with segment and word timestamps, see transcribe()"""
+        # Extract audio into a private scratch directory, removed afterwards
+        with ScratchSpace('transcription') as scratch:
+            audio_path = self._extract_audio(video_path, scratch.path)
+            scratch.check_quota()
+            return self.transcribe(audio_path, provider)
+
+    def transcribe_audio(self, audio_path, provider='openai'):
+        """Transcribe an already extracted audio file using specified AI provider"""
+        return self.transcribe(audio_path, provider)['text']
+
+    def transcribe(self, audio_path, provider='openai'):
+        """Transcript of an audio file with segment timestamps
+
+        Long audio is cut at silences into chunks that are transcribed
+        concurrently (at most TRANSCRIPTION_MAX_WORKERS requests at once),
+        then stitched back together with timestamps shifted to the chunk
+        offsets. Returns {'text': ..., 'segments': [{'start', 'end', 'text'}],
+        'words': [{'start', 'end', 'word'}]}.
+
+        Identical audio already transcribed with the same provider, model
+        and options is answered from the cache without any API call.
+        """
+        samples = load_pcm(audio_path)
+        options = self._transcription_options()
+        audio_hash = None
+        model = self._transcription_model(provider)
+        if model:
+            audio_hash = fingerprint_audio(samples)
+            cached = self.cache.get(self.cache.make_key(audio_hash, provider, model, options))
+            if cached is not None:
+                return cached
+
+        with ScratchSpace('transcription-chunks') as scratch:
+            chunks = split_audio(audio_path, scratch.path, samples=samples)
+            if len(chunks) == 1:
+                answers = [self._transcribe_file(audio_path, provider)]
             else:
-                raise ValueError("No audio track found in video")
+                with ThreadPoolExecutor(max_workers=settings.TRANSCRIPTION_MAX_WORKERS) as pool:
+                    answers = list(pool.map(lambda chunk: self._transcribe_file(chunk[0], provider), chunks))
+        transcript = _join_answers(chunks, answers)
+
+        # Cached under the provider that answered: a fallback's transcript
+        # must not be served as the requested provider's
+        answered = _answered_by(answers)
+        answered_model = self._transcription_model(answered)
+        if answered_model:
+            audio_hash = audio_hash or fingerprint_audio(samples)
+            cache_key = self.cache.make_key(audio_hash, answered, answered_model, options)
+            self.cache.set(cache_key, transcript, audio_hash, answered, answered_model, options)
+        return transcript
 
-        return audio_path
+    def _transcription_model(self, provider):
+        """Model a provider transcribes with (None: never cached)"""
+        if provider == 'local':
+            return local_model_name()
+        return TRANSCRIPTION_MODELS.get(provider)
+
+    def _transcription_options(self):
+        """Settings that change the transcript of a given audio (cache key part)"""
+        return {
+            'chunk_duration': settings.TRANSCRIPTION_CHUNK_DURATION,
+            'split_window': settings.TRANSCRIPTION_SPLIT_WINDOW,
+            'timestamps': ['segment', 'word'],
+        }
+
+    def _transcribe_file(self, audio_path, provider):
+        """Transcribe one audio file, on provider or the best healthy fallback
+
+        Returns (provider that answered, transcript).
+        """
+        return get_router('transcription').call(
+            self._transcription_providers(provider),
+            lambda candidate: (candidate, self._transcribe_with(audio_path, candidate)),
+            preferred=provider
+        )
+
+    def _transcription_providers(self, provider):
+        """Configured providers able to transcribe; the requested one included"""
+        configured = {
+            'openai': self.openai_client is not None,
+            'groq': self.groq_client is not None,
+            'gemini': self.gemini_configured,
+            'local': local_engine_configured(),
+        }
+        # Gemini (placeholder) and the local engine are only used when asked
+        # for explicitly; the remote providers stay their fallbacks
+        candidates = [name for name in TRANSCRIPTION_MODELS if configured[name]]
+        if provider in ('gemini', 'local') and configured[provider]:
+            candidates.append(provider)
+        if provider not in configured:
+            raise ValueError(f"Provider {provider} not available or not configured")
+        return candidates
+
+    def _transcribe_with(self, audio_path, provider):
+        """Transcribe one audio file (one provider request)"""
+        if provider == 'openai' and self.openai_client:
+            return self._transcribe_with_openai(audio_path)
+        elif provider == 'groq' and self.groq_client:
+            return self._transcribe_with_groq(audio_path)
+        elif provider == 'gemini' and self.gemini_configured:
+            return self._transcribe_with_gemini(audio_path)
+        elif provider == 'local' and local_engine_configured():
+            return self._transcribe_with_local(audio_path)
+        else:
+            raise ValueError(f"Provider {provider} not available or not configured")
+
+    def _extract_audio(self, video_path, output_dir):
+        """Extract audio from video file as 16kHz mono speech audio"""
+        return extract_speech_audio(video_path, output_dir, max_size=settings.SCRATCH_QUOTA)
 
     def _transcribe_with_openai(self, audio_path):
         """Transcribe using OpenAI Whisper"""
         with open(audio_path, 'rb') as audio_file:
             transcript = self.openai_client.audio.transcriptions.create(
-                model="whisper-1",
+                model=TRANSCRIPTION_MODELS['openai'],
                 file=audio_file,
-                response_format="text"
+                response_format="verbose_json",
+                timestamp_granularities=["word", "segment"]
             )
-        return transcript
+        return _parse_verbose_transcript(transcript)
 
     def _transcribe_with_groq(self, audio_path):
         """Transcribe using Groq"""
         with open(audio_path, 'rb') as audio_file:
             transcript = self.groq_client.audio.transcriptions.create(
                 file=(audio_path, audio_file.read()),
-                model="whisper-large-v3",
-                response_format="text"
+                model=TRANSCRIPTION_MODELS['groq'],
+                response_format="verbose_json",
+                extra_body={'timestamp_granularities': ["word", "segment"]}
             )
-        return transcript.text
+        return _parse_verbose_transcript(transcript)
+
+    def _transcribe_with_local(self, audio_path):
+        """Transcribe with the engine loaded in this worker process"""
+        return get_local_engine().transcribe(audio_path)
 
     def _transcribe_with_gemini(self, audio_path):
         """Transcribe using Google Gemini"""
@@ -77,41 +182,84 @@ class TranscriptionService:
         model = genai.GenerativeModel('gemini-pro')
         
         # For now, return a placeholder
-        return "Gemini transcription not yet implemented"
+        return {'text': "Gemini transcription not yet implemented", 'segments': [], 'words': []}
 
 
 class ContentAnalysisService:
     """Service for analyzing video content using AI"""
 
     def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
-        
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
+        # Process-wide clients: connections are reused across services
+        self.openai_client = get_openai_client()
+        self.gemini_configured = configure_gemini()
+
+        self.cache = AnalysisCache()
 
     def analyze_content(self, transcription, provider='openai'):
-        """Analyze content and generate tags, summary, etc."""
-        if provider == 'openai' and self.openai_client:
-            return self._analyze_with_openai(transcription)
-        elif provider == 'gemini' and settings.GEMINI_API_KEY:
-            return self._analyze_with_gemini(transcription)
-        else:
-            raise ValueError(f"Provider {provider} not available")
+        """Analyze content and generate tags, summary, etc.
 
-    def _analyze_with_openai(self, transcription):
-        """Analyze content using OpenAI GPT"""
-        prompt = f"""
-        Analyze the following video transcription and provide:
-        1. A brief summary (max 100 words)
-        2. 5-10 relevant tags
-        3. Main topics discussed
-        4. Sentiment analysis (positive, negative, neutral)
+        provider is tried first; a slow or failing provider falls over to
+        the other configured one (see routing.ProviderRouter). Transcripts
+        longer than ANALYSIS_CHUNK_TOKENS are analyzed in chunks.
+        """
+        if count_tokens(transcription) <= settings.ANALYSIS_CHUNK_TOKENS:
+            return self._request(analysis_prompt(transcription), provider)[1]
+        return self._analyze_chunked(transcription, provider)
+
+    def _analyze_chunked(self, transcription, provider):
+        """Map-reduce analysis of a long transcript
+
+        The chunks are analyzed concurrently (at most ANALYSIS_MAX_WORKERS
+        requests at once), chunks analyzed before are taken from the cache,
+        then one more request summarizes the chunk summaries. Returns the
+        same JSON document as a single-prompt analysis.
+        """
+        chunks = split_transcript(transcription)
+        keys = [chunk_key(chunk, provider) for chunk in chunks]
+        partials = self.cache.get_many(keys)
+
+        missing = [index for index, key in enumerate(keys) if key not in partials]
+        with ThreadPoolExecutor(max_workers=settings.ANALYSIS_MAX_WORKERS) as pool:
+            answers = list(pool.map(
+                lambda index: self._request(chunk_prompt(chunks[index], index + 1, len(chunks)), provider),
+                missing
+            ))
+        analyzed, entries = _analyzed_chunks(chunks, missing, answers)
+        for answered, results in entries.items():
+            self.cache.set_many(results, answered)
 
-        Transcription: {transcription}
+        ordered = [analyzed[index] if index in analyzed else partials[key] for index, key in enumerate(keys)]
+        summary = parse_analysis(self._request(reduce_prompt(ordered), provider)[1])['summary']
+        return json.dumps(merge_analyses(ordered, [count_tokens(chunk) for chunk in chunks], summary))
 
-        Please format your response as JSON with keys: summary, tags, topics, sentiment
+    def _request(self, prompt, provider):
+        """Send one analysis prompt, on provider or the best healthy fallback
+
+        Returns (provider that answered, response text).
         """
+        configured = {
+            'openai': self.openai_client is not None,
+            'gemini': self.gemini_configured,
+        }
+        if provider not in configured:
+            raise ValueError(f"Provider {provider} not available")
+        return get_router('analysis').call(
+            [name for name, available in configured.items() if available],
+            lambda candidate: (candidate, self._analyze_with(prompt, candidate)),
+            preferred=provider
+        )
+
+    def _analyze_with(self, prompt, provider):
+        """Send an analysis prompt to one provider (one request)"""
+        if provider == 'openai' and self.openai_client:
+            return self._analyze_with_openai(prompt)
+        elif provider == 'gemini' and self.gemini_configured:
+            return self._analyze_with_gemini(prompt)
+        else:
+            raise ValueError(f"Provider {provider} not available")
 
+    def _analyze_with_openai(self, prompt):
+        """Analyze content using OpenAI GPT"""
         response = self.openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
@@ -120,21 +268,61 @@ class ContentAnalysisService:
 
         return response.choices[0].message.content
 
-    def _analyze_with_gemini(self, transcription):
+    def _analyze_with_gemini(self, prompt):
         """Analyze content using Google Gemini"""
         model = genai.GenerativeModel('gemini-pro')
-        
-        prompt = f"""
-        Analyze the following video transcription and provide:
-        1. A brief summary (max 100 words)
-        2. 5-10 relevant tags
-        3. Main topics discussed
-        4. Sentiment analysis (positive, negative, neutral)
+        response = model.generate_content(prompt, request_options=gemini_request_options())
+        return response.text
 
-        Transcription: {transcription}
 
-        Please format your response as JSON with keys: summary, tags, topics, sentiment
-        """
+def _analyzed_chunks(chunks, indexes, answers):
+    """Analyses of the (provider, text) answers for the chunks at indexes
+
+    Returns ({chunk index: analysis}, {provider: {chunk key: analysis}}):
+    each chunk is cached under the provider that answered it, so a
+    fallback's analysis is not served as the requested provider's.
+    """
+    analyzed = {}
+    entries = {}
+    for index, (answered, text) in zip(indexes, answers):
+        analyzed[index] = parse_analysis(text)
+        entries.setdefault(answered, {})[chunk_key(chunks[index], answered)] = analyzed[index]
+    return analyzed, entries
+
+
+def _join_answers(chunks, answers):
+    """Transcript of the (provider, transcript) answers for the chunks of one audio file"""
+    if len(answers) == 1:
+        return answers[0][1]
+    return stitch_transcripts(zip([offset for _, offset in chunks], [transcript for _, transcript in answers]))
+
+
+def _answered_by(answers):
+    """Provider that answered every chunk (None when they came from several)"""
+    providers = {provider for provider, _ in answers}
+    return providers.pop() if len(providers) == 1 else None
+
+
+def _parse_verbose_transcript(transcript):
+    """Text, segment and word timestamps of a Whisper verbose_json response"""
+    data = transcript.model_dump()
+    return {
+        'text': data.get('text') or '',
+        'segments': [
+            {
+                'start': float(segment['start']),
+                'end': float(segment['end']),
+                'text': segment['text'].strip(),
+            }
+            for segment in data.get('segments') or []
+        ],
+        'words': [
+            {
+                'word': word['word'].strip(),
+                'start': float(word['start']),
+                'end': float(word['end']),
+            }
+            for word in data.get('words') or []
+        ],
+    }
 
-        response = model.generate_content(prompt)
-        return response.text
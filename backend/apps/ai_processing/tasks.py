@@ -0,0 +1,135 @@
+import asyncio
+import uuid
+from asgiref.sync import sync_to_async
+from celery import shared_task
+from django.utils import timezone
+from apps.videos.fairshare import FairShareScheduler
+from apps.videos.models import Video, VideoProcessingTask
+from apps.videos.transcripts import save_transcript
+from .analysis import load_analysis, save_video_analysis
+from .async_services import AsyncTranscriptionService
+from .services import TranscriptionService, ContentAnalysisService
+
+
+def transcription_key(video_id):
+    """Fair-share job key of an on-demand transcription"""
+    return f"transcribe:{video_id}"
+
+
+def analysis_key(video_id):
+    """Fair-share job key of an on-demand content analysis"""
+    return f"analyze:{video_id}"
+
+
+def batch_key():
+    """Fair-share job key of a batch transcription (each batch is its own job)"""
+    return f"batch-transcribe:{uuid.uuid4().hex}"
+
+
+@shared_task(bind=True)
+def transcribe_video_task(self, video_id, provider='openai'):
+    """Transcribe an already processed video on demand"""
+    video = Video.objects.get(id=video_id)
+    task = VideoProcessingTask.objects.create(
+        video=video,
+        task_type='extract_transcription',
+        celery_task_id=self.request.id,
+        status='processing',
+        started_at=timezone.now()
+    )
+    try:
+        transcription_service = TranscriptionService()
+        transcript = transcription_service.video_transcript(video.video_file.path, provider)
+        save_transcript(video, transcript, provider)
+
+        task.status = 'completed'
+        task.result = {'transcription': transcript['text'], 'provider': provider}
+        task.completed_at = timezone.now()
+        task.save()
+
+    except Exception as e:
+        task.status = 'failed'
+        task.error_message = str(e)
+        task.save()
+
+    finally:
+        FairShareScheduler().release(video.user_id, transcription_key(video_id))
+
+
+@shared_task(bind=True)
+def analyze_content_task(self, video_id, provider='openai'):
+    """Analyze the transcription of a video on demand"""
+    video = Video.objects.get(id=video_id)
+    task = VideoProcessingTask.objects.create(
+        video=video,
+        task_type='analyze_content',
+        celery_task_id=self.request.id,
+        status='processing',
+        started_at=timezone.now()
+    )
+    try:
+        analysis_service = ContentAnalysisService()
+        analysis = load_analysis(analysis_service.analyze_content(video.transcription, provider=provider))
+        save_video_analysis(video, analysis, provider)
+
+        task.status = 'completed'
+        task.result = {'analysis': analysis, 'provider': provider}
+        task.completed_at = timezone.now()
+        task.save()
+
+    except Exception as e:
+        task.status = 'failed'
+        task.error_message = str(e)
+        task.save()
+
+    finally:
+        FairShareScheduler().release(video.user_id, analysis_key(video_id))
+
+
+@shared_task(bind=True)
+def batch_transcribe_task(self, user_id, video_ids, provider='openai', key=None):
+    """Transcribe many videos concurrently in one event loop
+
+    Provider requests of the whole batch are awaited together on async
+    clients, at most AI_BATCH_CONCURRENCY at once, instead of taking a
+    worker thread per video. Every video gets its own task row and
+    succeeds or fails on its own.
+    """
+    try:
+        tasks = [
+            VideoProcessingTask.objects.create(
+                video=video,
+                task_type='extract_transcription',
+                celery_task_id=self.request.id,
+                status='processing',
+                started_at=timezone.now()
+            )
+            for video in Video.objects.filter(id__in=video_ids, user_id=user_id)
+        ]
+        asyncio.run(_transcribe_batch(tasks, provider))
+
+    finally:
+        if key:
+            FairShareScheduler().release(user_id, key)
+
+
+async def _transcribe_batch(tasks, provider):
+    async with AsyncTranscriptionService() as service:
+        await asyncio.gather(*[_transcribe_one(service, task, provider) for task in tasks])
+
+
+async def _transcribe_one(service, task, provider):
+    video = task.video
+    try:
+        transcript = await service.video_transcript(video.video_file.path, provider)
+        await sync_to_async(save_transcript)(video, transcript, provider)
+
+        task.status = 'completed'
+        task.result = {'transcription': transcript['text'], 'provider': provider}
+        task.completed_at = timezone.now()
+        await sync_to_async(task.save)()
+
+    except Exception as e:
+        task.status = 'failed'
+        task.error_message = str(e)
+        await sync_to_async(task.save)()
@@ -0,0 +1,134 @@
+from unittest import mock
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from apps.ai_processing import local_engine, services
+from apps.ai_processing.cache import TranscriptionCache
+from apps.ai_processing.local_engine import (
+    STUB_TRANSCRIPT, StubEngine, get_local_engine, local_model_name, reset_local_engine
+)
+from apps.ai_processing.services import TranscriptionService
+
+STUB_SETTINGS = {
+    'engine': 'stub',
+    'model': 'tiny',
+    'device': 'cpu',
+    'compute_type': 'int8',
+    'cpu_threads': 1,
+    'num_workers': 1,
+    'beam_size': 1,
+    'download_root': None,
+    'queue': 'ai',
+}
+
+# Two seconds of silence at TRANSCRIPTION_SAMPLE_RATE
+SAMPLES = np.zeros(2 * 16000, dtype=np.int16)
+
+
+def _decoded(*args, **kwargs):
+    return SAMPLES
+
+
+@override_settings(LOCAL_TRANSCRIPTION=STUB_SETTINGS, TRANSCRIPTION_SAMPLE_RATE=16000)
+class LocalEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_local_engine()
+        self.addCleanup(reset_local_engine)
+        patcher = mock.patch.object(local_engine, 'load_pcm', side_effect=_decoded)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stub_engine_spreads_words_over_the_audio(self):
+        transcript = StubEngine(STUB_SETTINGS).transcribe('audio.m4a')
+
+        self.assertEqual(transcript['text'], STUB_TRANSCRIPT)
+        self.assertEqual(transcript['segments'], [{'start': 0.0, 'end': 2.0, 'text': STUB_TRANSCRIPT}])
+        self.assertEqual([word['word'] for word in transcript['words']], STUB_TRANSCRIPT.split())
+        self.assertEqual(transcript['words'][0]['start'], 0.0)
+        self.assertEqual(transcript['words'][-1]['end'], 2.0)
+
+    def test_engine_is_loaded_once_per_process(self):
+        engine = get_local_engine()
+
+        self.assertIsInstance(engine, StubEngine)
+        self.assertIs(get_local_engine(), engine)
+
+    def test_reset_forgets_the_engine(self):
+        engine = get_local_engine()
+        reset_local_engine()
+
+        self.assertIsNot(get_local_engine(), engine)
+
+    @override_settings(LOCAL_TRANSCRIPTION={**STUB_SETTINGS, 'engine': ''})
+    def test_no_engine_when_not_configured(self):
+        self.assertIsNone(get_local_engine())
+
+    @override_settings(LOCAL_TRANSCRIPTION={**STUB_SETTINGS, 'engine': 'unknown'})
+    def test_unknown_engine_is_a_configuration_error(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_local_engine()
+
+    def test_model_name_identifies_engine_and_model(self):
+        self.assertEqual(local_model_name(), 'stub:tiny')
+
+
+@override_settings(LOCAL_TRANSCRIPTION=STUB_SETTINGS, TRANSCRIPTION_SAMPLE_RATE=16000)
+class LocalTranscriptionServiceTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_local_engine()
+        self.addCleanup(reset_local_engine)
+        for module in (local_engine, services):
+            patcher = mock.patch.object(module, 'load_pcm', side_effect=_decoded)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.service = TranscriptionService()
+        # Remote providers unavailable: only the local engine can answer
+        self.service.openai_client = None
+        self.service.groq_client = None
+        self.service.gemini_configured = False
+        self.service.cache = mock.Mock(wraps=TranscriptionCache())
+        self.service.cache.get.return_value = None
+        self.service.cache.set.return_value = None
+
+    def test_transcribe_with_local_uses_the_process_engine(self):
+        transcript = self.service._transcribe_with_local('audio.m4a')
+
+        self.assertEqual(transcript, get_local_engine().transcribe('audio.m4a'))
+
+    def test_local_is_a_candidate_only_when_requested(self):
+        self.assertEqual(self.service._transcription_providers('local'), ['local'])
+        self.assertEqual(self.service._transcription_providers('openai'), [])
+
+    def test_local_transcripts_are_cached_under_the_engine_model(self):
+        self.assertEqual(self.service._transcription_model('local'), 'stub:tiny')
+
+        transcript = self.service.transcribe('audio.m4a', provider='local')
+
+        self.assertEqual(transcript['text'], STUB_TRANSCRIPT)
+        key = self.service.cache.make_key.call_args.args
+        self.assertEqual(key[1:3], ('local', 'stub:tiny'))
+        self.service.cache.set.assert_called_once()
+
+    def test_fallback_answer_is_cached_under_the_fallback_provider(self):
+        remote = {'text': 'Remote transcript', 'segments': [], 'words': []}
+        self.service.openai_client = mock.Mock()
+        self.service._transcribe_with_openai = mock.Mock(return_value=remote)
+        self.service._transcribe_with_local = mock.Mock(side_effect=RuntimeError("Model crashed"))
+
+        transcript = self.service.transcribe('audio.m4a', provider='local')
+
+        self.assertEqual(transcript, remote)
+        _, _, _, provider, model, _ = self.service.cache.set.call_args.args
+        self.assertEqual((provider, model), ('openai', 'whisper-1'))
+
+    def test_another_model_gets_another_cache_key(self):
+        options = self.service._transcription_options()
+        key = TranscriptionCache.make_key('hash', 'local', local_model_name(), options)
+
+        with override_settings(LOCAL_TRANSCRIPTION={**STUB_SETTINGS, 'model': 'small'}):
+            other = TranscriptionCache.make_key('hash', 'local', local_model_name(), options)
+
+        self.assertNotEqual(key, other)
@@ -0,0 +1,217 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import openai
+from django.test import SimpleTestCase, override_settings
+from apps.ai_processing import routing
+from apps.ai_processing.fake_provider import FakeProviderServer
+from apps.ai_processing.routing import ProviderRouter, ProviderUnavailable, is_provider_fault
+
+ROUTER_SETTINGS = {
+    'window': 10,
+    'failure_threshold': 3,
+    'error_rate_threshold': 0.5,
+    'cooldown': 60,
+    'hedging': True,
+    'hedge_quantile': 0.95,
+    'hedge_min_samples': 3,
+    'max_threads': 4,
+}
+
+PROMPT = [{'role': 'user', 'content': 'Analyze this'}]
+
+
+@override_settings(AI_ROUTER=ROUTER_SETTINGS)
+class ProviderRouterTests(SimpleTestCase):
+    """ProviderRouter against fake OpenAI-compatible providers over HTTP"""
+
+    def setUp(self):
+        self.servers = {}
+        self.clients = {}
+        pool = ThreadPoolExecutor(max_workers=ROUTER_SETTINGS['max_threads'])
+        self.addCleanup(pool.shutdown)
+        patcher = mock.patch.object(routing, '_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ProviderRouter('test')
+
+    def start_provider(self, name, **options):
+        server = FakeProviderServer(('127.0.0.1', 0), **options)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.servers[name] = server
+        self.clients[name] = openai.OpenAI(
+            api_key='test',
+            base_url=f"http://127.0.0.1:{server.server_port}/v1",
+            max_retries=0,
+            timeout=5
+        )
+        return server
+
+    def request(self, provider):
+        response = self.clients[provider].chat.completions.create(model='fake', messages=PROMPT)
+        return provider, response.choices[0].message.content
+
+    def call(self, preferred='primary'):
+        return self.router.call(list(self.servers), self.request, preferred=preferred)
+
+    def warm(self, provider, latency, count=ROUTER_SETTINGS['hedge_min_samples']):
+        for _ in range(count):
+            self.router.get_health(provider).record_success(latency)
+
+    def test_preferred_provider_answers(self):
+        self.start_provider('primary', latency=0.0)
+        self.start_provider('secondary', latency=0.0)
+
+        provider, _ = self.call()
+
+        self.assertEqual(provider, 'primary')
+        self.assertEqual(self.servers['secondary'].requests, 0)
+
+    def test_server_error_fails_over(self):
+        self.start_provider('primary', latency=0.0, error_rate=1.0, error_status=503)
+        self.start_provider('secondary', latency=0.0)
+
+        provider, _ = self.call()
+
+        self.assertEqual(provider, 'secondary')
+        self.assertEqual(self.router.get_health('primary').consecutive_failures, 1)
+
+    def test_all_providers_failing_raises(self):
+        self.start_provider('primary', latency=0.0, error_rate=1.0)
+        self.start_provider('secondary', latency=0.0, error_rate=1.0)
+
+        with self.assertRaises(ProviderUnavailable):
+            self.call()
+
+    def test_circuit_opens_after_consecutive_server_errors(self):
+        primary = self.start_provider('primary', latency=0.0, error_rate=1.0, error_status=503)
+        self.start_provider('secondary', latency=0.0)
+
+        for _ in range(ROUTER_SETTINGS['failure_threshold']):
+            self.call()
+        self.assertTrue(self.router.get_health('primary').is_open())
+
+        provider, _ = self.call()
+        self.assertEqual(provider, 'secondary')
+        self.assertEqual(primary.requests, ROUTER_SETTINGS['failure_threshold'])
+
+    def test_rate_limiting_counts_against_the_provider(self):
+        self.start_provider('primary', latency=0.0, error_rate=1.0, error_status=429)
+        self.start_provider('secondary', latency=0.0)
+
+        for _ in range(ROUTER_SETTINGS['failure_threshold']):
+            self.call()
+
+        self.assertTrue(self.router.get_health('primary').is_open())
+
+    def test_client_errors_fail_over_without_opening_the_circuit(self):
+        primary = self.start_provider('primary', latency=0.0, error_rate=1.0, error_status=400)
+        self.start_provider('secondary', latency=0.0)
+
+        for _ in range(ROUTER_SETTINGS['failure_threshold'] + 1):
+            provider, _ = self.call()
+            self.assertEqual(provider, 'secondary')
+
+        health = self.router.get_health('primary')
+        self.assertFalse(health.is_open())
+        self.assertEqual(health.consecutive_failures, 0)
+        self.assertEqual(primary.requests, ROUTER_SETTINGS['failure_threshold'] + 1)
+
+    def test_half_open_trial_closes_the_circuit_on_success(self):
+        self.start_provider('primary', latency=0.0)
+        self.start_provider('secondary', latency=0.0)
+        health = self.router.get_health('primary')
+        for _ in range(ROUTER_SETTINGS['failure_threshold']):
+            health.record_failure()
+        # Cooldown over: the next request is the trial
+        health.opened_at -= ROUTER_SETTINGS['cooldown']
+
+        provider, _ = self.call()
+
+        self.assertEqual(provider, 'primary')
+        self.assertFalse(health.is_open())
+
+    def test_slow_provider_is_hedged(self):
+        self.start_provider('primary', latency=2.0)
+        self.start_provider('secondary', latency=0.0)
+        self.warm('primary', 0.1)
+
+        started = time.monotonic()
+        provider, _ = self.call()
+
+        self.assertEqual(provider, 'secondary')
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_no_hedging_without_enough_samples(self):
+        self.start_provider('primary', latency=0.3)
+        secondary = self.start_provider('secondary', latency=0.0)
+        self.warm('primary', 0.01, count=ROUTER_SETTINGS['hedge_min_samples'] - 1)
+
+        provider, _ = self.call()
+
+        self.assertEqual(provider, 'primary')
+        self.assertEqual(secondary.requests, 0)
+
+    def test_time_queued_for_a_thread_does_not_trigger_a_hedge(self):
+        self.start_provider('primary', latency=0.05)
+        secondary = self.start_provider('secondary', latency=0.0)
+        self.warm('primary', 0.2)
+
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        with mock.patch.object(routing, '_pool', pool):
+            # Keep the only thread busy for longer than the hedge delay
+            pool.submit(time.sleep, 0.5)
+            provider, _ = self.call()
+            pool.shutdown(wait=True)
+
+        self.assertEqual(provider, 'primary')
+        self.assertEqual(secondary.requests, 0)
+
+    def test_async_call_fails_over_and_hedges(self):
+        self.start_provider('primary', latency=2.0)
+        self.start_provider('secondary', latency=0.0)
+        self.warm('primary', 0.1)
+
+        async def run():
+            clients = {
+                name: openai.AsyncOpenAI(api_key='test', base_url=client.base_url, max_retries=0, timeout=5)
+                for name, client in self.clients.items()
+            }
+
+            async def request(provider):
+                response = await clients[provider].chat.completions.create(model='fake', messages=PROMPT)
+                return provider, response.choices[0].message.content
+
+            try:
+                return await self.router.acall(list(clients), request, preferred='primary')
+            finally:
+                for client in clients.values():
+                    await client.close()
+
+        started = time.monotonic()
+        provider, _ = asyncio.run(run())
+
+        self.assertEqual(provider, 'secondary')
+        self.assertLess(time.monotonic() - started, 1.0)
+        # The losing request was cancelled: neither a success nor a failure
+        self.assertEqual(self.router.get_health('primary').consecutive_failures, 0)
+
+
+class ProviderFaultTests(SimpleTestCase):
+
+    def test_timeouts_and_connection_errors_are_provider_faults(self):
+        request = mock.Mock()
+        self.assertTrue(is_provider_fault(openai.APITimeoutError(request=request)))
+        self.assertTrue(is_provider_fault(openai.APIConnectionError(request=request)))
+        self.assertTrue(is_provider_fault(TimeoutError()))
+
+    def test_other_errors_are_not_provider_faults(self):
+        self.assertFalse(is_provider_fault(ValueError("Provider not configured")))
+        self.assertFalse(is_provider_fault(KeyError('choices')))
@@ -2,10 +2,13 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from apps.videos.fairshare import FairShareScheduler
 from apps.videos.models import Video
+from .local_engine import local_engine_configured
 from .services import TranscriptionService, ContentAnalysisService
-from .tasks import transcribe_video_task, analyze_content_task
+from .tasks import analysis_key, batch_key, transcription_key
 
 
 @api_view(['POST'])
@@ -29,12 +32,22 @@ def transcribe_video(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Start transcription task
-    task = transcribe_video_task.delay(video.id, provider)
+    # Start transcription task, queued behind the user's fair share
+    task_id = FairShareScheduler().submit(
+        request.user.id,
+        'apps.ai_processing.tasks.transcribe_video_task',
+        (video.id, provider),
+        key=transcription_key(video.id)
+    )
+    if not task_id:
+        return Response(
+            {'error': 'Transcription already in progress'}, 
+            status=status.HTTP_409_CONFLICT
+        )
     
     return Response({
         'message': 'Transcription started',
-        'task_id': task.id,
+        'task_id': task_id,
         'video_id': video.id,
         'provider': provider
     })
@@ -61,12 +74,22 @@ def analyze_content(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Start content analysis task
-    task = analyze_content_task.delay(video.id, provider)
+    # Start content analysis task, queued behind the user's fair share
+    task_id = FairShareScheduler().submit(
+        request.user.id,
+        'apps.ai_processing.tasks.analyze_content_task',
+        (video.id, provider),
+        key=analysis_key(video.id)
+    )
+    if not task_id:
+        return Response(
+            {'error': 'Content analysis already in progress'}, 
+            status=status.HTTP_409_CONFLICT
+        )
     
     return Response({
         'message': 'Content analysis started',
-        'task_id': task.id,
+        'task_id': task_id,
         'video_id': video.id,
         'provider': provider
     })
@@ -97,6 +120,14 @@ def ai_providers(request):
         }
     ]
     
+    if local_engine_configured():
+        providers.append({
+            'name': 'local',
+            'display_name': 'Local (Whisper)',
+            'services': ['transcription'],
+            'description': 'Offline transcription on the worker CPUs'
+        })
+    
     return Response({'providers': providers})
 
 
@@ -125,13 +156,22 @@ def batch_transcribe(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    # Videos are transcribed in batches of AI_BATCH_SIZE, each one job in
+    # the user's own fair-share queue (so a large batch does not hold up
+    # other users' videos) running its provider calls concurrently
+    video_ids = [video.id for video in videos]
+    scheduler = FairShareScheduler()
     tasks = []
-    for video in videos:
-        task = transcribe_video_task.delay(video.id, provider)
-        tasks.append({
-            'video_id': video.id,
-            'task_id': task.id
-        })
+    for start in range(0, len(video_ids), settings.AI_BATCH_SIZE):
+        batch = video_ids[start:start + settings.AI_BATCH_SIZE]
+        key = batch_key()
+        task_id = scheduler.submit(
+            request.user.id,
+            'apps.ai_processing.tasks.batch_transcribe_task',
+            (request.user.id, batch, provider, key),
+            key=key
+        )
+        tasks.extend({'video_id': video_id, 'task_id': task_id} for video_id in batch)
     
     return Response({
         'message': f'Transcription started for {len(tasks)} videos',
@@ -148,7 +188,7 @@ def transcription_status(request, video_id):
     
     # Check if there's an active transcription task
     transcription_task = video.processing_tasks.filter(
-        task_type='transcription'
+        task_type='extract_transcription'
     ).order_by('-created_at').first()
     
     if not transcription_task:
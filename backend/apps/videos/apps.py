@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.videos'
+
+    def ready(self):
+        # Progress events (see progress.py)
+        from . import signals  # noqa: F401
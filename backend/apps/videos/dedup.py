@@ -0,0 +1,127 @@
+import hashlib
+import re
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .models import Video, VideoAnalysis, VideoMetadata, VideoRendition, VideoTranscript
+from .tagging import set_video_tags
+
+HASH_READ_SIZE = 1024 * 1024  # 1MB
+
+YOUTUBE_ID_PATTERNS = [
+    re.compile(r'youtu\.be/([\w-]{11})'),
+    re.compile(r'youtube\.com/(?:shorts|embed|live|v)/([\w-]{11})'),
+    re.compile(r'youtube\.com/.*[?&]v=([\w-]{11})'),
+]
+
+
+def hash_file(path):
+    """Streaming SHA-256 of a file, read in fixed-size blocks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def extract_youtube_id(url):
+    """Extract the 11-character video id from a YouTube URL (None if not found)"""
+    for pattern in YOUTUBE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
+
+
+def find_processed_duplicate(content_hash, exclude_id=None):
+    """Return a fully processed video with the same source content, if any
+
+    Only videos whose pipeline outputs (thumbnail, transcription and, when
+    enabled, HLS renditions) all exist qualify, so the reuser never has to
+    run a stage itself.
+    """
+    if not content_hash:
+        return None
+
+    candidates = (
+        Video.objects.filter(content_hash=content_hash, status='ready')
+        .exclude(id=exclude_id)
+        .exclude(thumbnail__isnull=True)
+        .exclude(thumbnail='')
+        .exclude(transcription='')
+    )
+    if settings.HLS_ENABLED:
+        candidates = candidates.exclude(hls_playlist='')
+    return candidates.order_by('created_at').first()
+
+
+def find_processed_youtube_video(youtube_id):
+    """Return a fully processed video previously downloaded from the same YouTube id"""
+    if not youtube_id:
+        return None
+
+    content_hash = (
+        Video.objects.filter(youtubedownload__youtube_id=youtube_id)
+        .exclude(content_hash='')
+        .values_list('content_hash', flat=True)
+        .first()
+    )
+    return find_processed_duplicate(content_hash)
+
+
+def reuse_processed_media(video, source):
+    """Point video at the pipeline outputs of source instead of re-running it
+
+    Files are shared by storage name, nothing is copied; the now redundant
+    source file of video is deleted. The metadata, timestamped transcript
+    and analysis rows are copied and the analysis tags added, as if the
+    stages had run for video.
+    """
+    previous_name = video.video_file.name
+    video.content_hash = source.content_hash
+    video.video_file.name = source.video_file.name
+    video.thumbnail.name = source.thumbnail.name
+    video.sprite_sheet.name = source.sprite_sheet.name
+    video.sprite_sheet_info = source.sprite_sheet_info
+    video.hls_playlist = source.hls_playlist
+    video.transcription = source.transcription
+    video.duration = source.duration
+    video.file_size = source.file_size
+    video.status = 'ready'
+    video.save()
+
+    if previous_name and previous_name != source.video_file.name:
+        default_storage.delete(previous_name)
+
+    video.renditions.all().delete()
+    VideoRendition.objects.bulk_create([
+        VideoRendition(
+            video=video,
+            name=rendition.name,
+            width=rendition.width,
+            height=rendition.height,
+            bitrate=rendition.bitrate,
+            playlist=rendition.playlist,
+            segment_paths=rendition.segment_paths,
+        )
+        for rendition in source.renditions.all()
+    ])
+
+    for model in (VideoMetadata, VideoTranscript, VideoAnalysis):
+        _copy_video_row(model, source, video)
+    set_video_tags(video, source.tags.values_list('name', flat=True), replace=False)
+    return video
+
+
+def _copy_video_row(model, source, video):
+    """Give video a copy of the one-to-one model row of source (if it has one)"""
+    row = model.objects.filter(video=source).first()
+    if row is None:
+        return
+    excluded = {model._meta.pk.name, 'video'}
+    values = {
+        field.attname: getattr(row, field.attname)
+        for field in model._meta.concrete_fields
+        if field.name not in excluded and not getattr(field, 'auto_now', False)
+        and not getattr(field, 'auto_now_add', False)
+    }
+    model.objects.update_or_create(video=video, defaults=values)
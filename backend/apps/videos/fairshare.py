@@ -0,0 +1,193 @@
+import json
+import time
+import uuid
+from celery import current_app
+from django.conf import settings
+from kombu.exceptions import OperationalError
+from .redis_client import get_redis
+
+KEY_PREFIX = 'fairshare'
+
+
+class FairShareScheduler:
+    """Per-user fair queueing in front of the Celery pipeline tasks
+
+    Jobs wait in one Redis list per user instead of the shared Celery queue.
+    Dispatch visits users in weighted round-robin order and hands a job to
+    Celery only while both the user's concurrency cap and the global
+    in-flight limit allow it, so a user with hundreds of jobs cannot delay
+    everyone else's. State lives in Redis, so web and worker nodes share it.
+
+    Every dispatched job holds a lease until release() is called for it (or
+    the lease expires, for jobs lost with a killed worker).
+
+        scheduler = FairShareScheduler()
+        scheduler.submit(user.id, 'apps.videos.tasks.process_video', (video.id,), key=f"process_video:{video.id}")
+        ...
+        scheduler.release(user.id, f"process_video:{video.id}")  # when the job is done
+    """
+
+    def __init__(self, client=None, max_per_user=None, max_in_flight=None, lease_timeout=None):
+        self.client = client or get_redis()
+        self.max_per_user = max_per_user or settings.FAIRSHARE_MAX_PER_USER
+        self.max_in_flight = max_in_flight or settings.FAIRSHARE_MAX_IN_FLIGHT
+        self.lease_timeout = lease_timeout or settings.FAIRSHARE_LEASE_TIMEOUT
+
+    def submit(self, user_id, task_name, args=(), key=None):
+        """Queue a job for user_id and dispatch whatever may run now
+
+        key identifies the job: a job whose key is already queued or running
+        is not queued again. Returns the Celery task id the job will run
+        under, or None for a duplicate.
+        """
+        key = key or uuid.uuid4().hex
+        job = {'key': key, 'task': task_name, 'args': list(args), 'task_id': str(uuid.uuid4())}
+
+        with self._lock():
+            if self.client.sismember(self._queued_key(user_id), key) or \
+                    self.client.zscore(self._running_key(user_id), key) is not None:
+                return None
+
+            pipe = self.client.pipeline()
+            pipe.rpush(self._queue_key(user_id), json.dumps(job))
+            pipe.sadd(self._queued_key(user_id), key)
+            pipe.execute()
+            if self.client.lpos(self._ring_key(), user_id) is None:
+                self.client.rpush(self._ring_key(), user_id)
+
+            self._dispatch()
+        return job['task_id']
+
+    def release(self, user_id, key):
+        """Free the slot held by a finished job and dispatch the next ones"""
+        with self._lock():
+            self.client.zrem(self._running_key(user_id), key)
+            self._dispatch()
+
+    def dispatch(self):
+        """Dispatch queued jobs into free slots (e.g. after leases expired)"""
+        with self._lock():
+            return self._dispatch()
+
+    def set_weight(self, user_id, weight):
+        """Jobs dispatched for user_id per round-robin turn (default 1)"""
+        self.client.hset(self._weights_key(), user_id, int(weight))
+
+    def pending(self, user_id):
+        """Number of jobs user_id has waiting"""
+        return self.client.llen(self._queue_key(user_id))
+
+    def _dispatch(self):
+        """Weighted round-robin over users with queued jobs; caller holds the lock"""
+        running = self._running_counts()
+        in_flight = sum(running.values())
+        weights = self.client.hgetall(self._weights_key())
+        dispatched = 0
+
+        progress = True
+        while progress and in_flight < self.max_in_flight:
+            progress = False
+            for user_id in self.client.lrange(self._ring_key(), 0, -1):
+                room = min(
+                    self.max_per_user - running.get(user_id, 0),
+                    self.max_in_flight - in_flight,
+                    int(weights.get(user_id, 1)),
+                )
+                for _ in range(max(room, 0)):
+                    raw = self.client.lpop(self._queue_key(user_id))
+                    if raw is None:
+                        break
+                    try:
+                        self._start(user_id, json.loads(raw))
+                    except OperationalError:
+                        # Broker unreachable: the job is back in its queue and
+                        # the next dispatch (at the latest the beat) retries
+                        return dispatched
+                    running[user_id] = running.get(user_id, 0) + 1
+                    in_flight += 1
+                    dispatched += 1
+                    progress = True
+
+                # Served users go to the back of the ring; drained ones leave it
+                self.client.lrem(self._ring_key(), 0, user_id)
+                if self.client.llen(self._queue_key(user_id)):
+                    self.client.rpush(self._ring_key(), user_id)
+                if in_flight >= self.max_in_flight:
+                    break
+        return dispatched
+
+    def _start(self, user_id, job):
+        """Take a lease for a popped job and send it to Celery
+
+        If the broker refuses it, the lease is dropped and the job goes back
+        to the head of the user's queue before the error is raised.
+        """
+        pipe = self.client.pipeline()
+        pipe.srem(self._queued_key(user_id), job['key'])
+        pipe.zadd(self._running_key(user_id), {job['key']: time.time() + self.lease_timeout})
+        pipe.sadd(self._busy_key(), user_id)
+        pipe.execute()
+        try:
+            current_app.send_task(job['task'], args=job['args'], task_id=job['task_id'])
+        except OperationalError:
+            pipe = self.client.pipeline()
+            pipe.zrem(self._running_key(user_id), job['key'])
+            pipe.lpush(self._queue_key(user_id), json.dumps(job))
+            pipe.sadd(self._queued_key(user_id), job['key'])
+            pipe.execute()
+            raise
+
+    def _running_counts(self):
+        """Live leases per user, dropping expired ones"""
+        now = time.time()
+        counts = {}
+        for user_id in self.client.smembers(self._busy_key()):
+            running_key = self._running_key(user_id)
+            self.client.zremrangebyscore(running_key, '-inf', now)
+            count = self.client.zcard(running_key)
+            if count:
+                counts[user_id] = count
+            else:
+                self.client.srem(self._busy_key(), user_id)
+        return counts
+
+    def _lock(self):
+        return self.client.lock(f"{KEY_PREFIX}:lock", timeout=30, blocking_timeout=10)
+
+    def _ring_key(self):
+        return f"{KEY_PREFIX}:ring"
+
+    def _busy_key(self):
+        return f"{KEY_PREFIX}:busy"
+
+    def _weights_key(self):
+        return f"{KEY_PREFIX}:weights"
+
+    def _queue_key(self, user_id):
+        return f"{KEY_PREFIX}:queue:{user_id}"
+
+    def _queued_key(self, user_id):
+        return f"{KEY_PREFIX}:queued:{user_id}"
+
+    def _running_key(self, user_id):
+        return f"{KEY_PREFIX}:running:{user_id}"
+
+
+def processing_key(video_id):
+    """Fair-share job key of a video's processing pipeline"""
+    return f"process_video:{video_id}"
+
+
+def submit_processing(video):
+    """Queue process_video for a video behind its owner's fair share"""
+    return FairShareScheduler().submit(
+        video.user_id,
+        'apps.videos.tasks.process_video',
+        (video.id, video.user_id),
+        key=processing_key(video.id)
+    )
+
+
+def release_processing(video):
+    """Free the fair-share slot held by a video's processing pipeline"""
+    FairShareScheduler().release(video.user_id, processing_key(video.id))
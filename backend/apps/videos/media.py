@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import subprocess
+from django.conf import settings
+
+
+# Speech audio for transcription: encoder arguments and file extension
+SPEECH_CODECS = {
+    'opus': (['-c:a', 'libopus', '-application', 'voip'], 'ogg'),
+    'flac': (['-c:a', 'flac', '-sample_fmt', 's16'], 'flac'),
+}
+
+# Pauses longer than this (seconds) are cut when silence trimming is on
+SILENCE_MIN_DURATION = 1.0
+
+
+class MediaProcessingError(Exception):
+    """Raised when ffmpeg/ffprobe cannot process a media file"""
+
+
+class OutputSizeExceeded(MediaProcessingError):
+    """Raised when ffmpeg output reached its size limit (and was cut there)"""
+
+
+def size_limit_args(max_size):
+    """ffmpeg output option stopping the output at max_size bytes (none without a limit)
+
+    Put it right before the output path. ffmpeg stops writing at the limit
+    instead of filling the disk; check_output_size() then tells a cut
+    output apart from a complete one.
+    """
+    return ['-fs', str(max_size)] if max_size else []
+
+
+def check_output_size(path, max_size):
+    """Raise OutputSizeExceeded when an output written with size_limit_args() was cut"""
+    if max_size and os.path.exists(path) and os.path.getsize(path) >= max_size:
+        raise OutputSizeExceeded(f"{os.path.basename(path)} reached the {max_size} bytes limit")
+
+
+def probe_media(source_path):
+    """Read container and stream headers with ffprobe (no decoding)
+
+    Only the headers are parsed, so this takes milliseconds regardless of
+    the file length.
+    """
+    command = [
+        settings.FFPROBE_BINARY,
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        source_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise MediaProcessingError(result.stderr.strip() or f"ffprobe failed on {source_path}")
+
+    data = json.loads(result.stdout or '{}')
+    container = data.get('format', {})
+    streams = data.get('streams', [])
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None) or {}
+    audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None) or {}
+
+    return {
+        'duration': float(container.get('duration') or 0),
+        'file_size': int(container.get('size') or os.path.getsize(source_path)),
+        'bitrate': int(container.get('bit_rate') or 0),
+        'container': container.get('format_name', ''),
+        'video_codec': video_stream.get('codec_name', ''),
+        'audio_codec': audio_stream.get('codec_name', ''),
+        'width': int(video_stream.get('width') or 0),
+        'height': int(video_stream.get('height') or 0),
+        'pixel_format': video_stream.get('pix_fmt', ''),
+        'frame_rate': _parse_rate(video_stream.get('avg_frame_rate') or video_stream.get('r_frame_rate')),
+        'video_bitrate': int(video_stream.get('bit_rate') or 0),
+        'audio_bitrate': int(audio_stream.get('bit_rate') or 0),
+        'has_video': bool(video_stream),
+        'has_audio': bool(audio_stream),
+    }
+
+
+def _parse_rate(rate):
+    """Parse an ffprobe rational such as '30000/1001' into frames per second"""
+    numerator, _, denominator = (rate or '0/0').partition('/')
+    try:
+        return round(float(numerator) / float(denominator or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def demux_media(source_path, output_dir, outputs=('audio', 'source'), info=None):
+    """Read the source a single time and write every artifact the pipeline needs
+
+    One ffmpeg process demuxes the input once and feeds several outputs:
+    - audio: first audio track as 16kHz mono speech audio, for transcription
+      (see speech_audio_args)
+    - source: stream copy of the input, read by the thumbnail, compression
+      and HLS stages so none of them reads the upload compression replaces
+
+    Pass the probe_media() result as info to avoid probing again. Returns a
+    dict with the path of each artifact (None when not produced).
+    """
+    info = info or probe_media(source_path)
+    if not info['has_video']:
+        raise MediaProcessingError("No video track found in video")
+
+    os.makedirs(output_dir, exist_ok=True)
+    artifacts = {'audio': None, 'source': None, 'duration': info['duration']}
+    command = [settings.FFMPEG_BINARY, '-y', '-v', 'error', '-i', source_path]
+
+    if 'audio' in outputs and info['has_audio']:
+        audio_args, extension = speech_audio_args()
+        artifacts['audio'] = os.path.join(output_dir, f'audio.{extension}')
+        command += ['-map', '0:a:0', '-vn', *audio_args, artifacts['audio']]
+
+    if 'source' in outputs:
+        artifacts['source'] = os.path.join(output_dir, 'source.mkv')
+        command += [
+            '-map', '0:v:0',
+            '-map', '0:a:0?',
+            '-c', 'copy',
+            artifacts['source'],
+        ]
+
+    if not any(artifacts[name] for name in ('audio', 'source')):
+        # e.g. only audio was requested and there is no audio track
+        return artifacts
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise MediaProcessingError(result.stderr.strip() or f"ffmpeg failed on {source_path}")
+
+    return artifacts
+
+
+def extract_speech_audio(source_path, output_dir, info=None, max_size=None):
+    """Encode the first audio track as compact speech audio in one ffmpeg pass
+
+    ffmpeg decodes and encodes in a stream, so no intermediate WAV is ever
+    written; it stops at max_size bytes. Returns the output path.
+    """
+    info = info or probe_media(source_path)
+    if not info['has_audio']:
+        raise MediaProcessingError("No audio track found in video")
+
+    audio_args, extension = speech_audio_args()
+    output_path = os.path.join(output_dir, f'audio.{extension}')
+    command = [
+        settings.FFMPEG_BINARY, '-y', '-v', 'error',
+        '-i', source_path,
+        '-map', '0:a:0',
+        '-vn',
+        *audio_args,
+        *size_limit_args(max_size),
+        output_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise MediaProcessingError(result.stderr.strip() or f"ffmpeg failed on {source_path}")
+    check_output_size(output_path, max_size)
+    return output_path
+
+
+def speech_audio_args(codec=None, trim_silence=None):
+    """ffmpeg output arguments for transcription audio, and its file extension
+
+    Speech recognition models work on 16kHz mono, so anything above that
+    is only upload time: a minute of Opus at 24kbit/s is ~180KB against
+    ~10MB of 44.1kHz stereo WAV. FLAC is lossless, for providers or models
+    that do worse on lossy input.
+    """
+    codec = codec or settings.TRANSCRIPTION_AUDIO_CODEC
+    trim_silence = settings.TRANSCRIPTION_TRIM_SILENCE if trim_silence is None else trim_silence
+    if codec not in SPEECH_CODECS:
+        raise MediaProcessingError(f"Unsupported transcription audio codec {codec}")
+
+    encoder_args, extension = SPEECH_CODECS[codec]
+    args = ['-ac', '1', '-ar', str(settings.TRANSCRIPTION_SAMPLE_RATE)]
+    if trim_silence:
+        # Cut leading silence and every pause longer than SILENCE_MIN_DURATION
+        args += ['-af', (
+            'silenceremove=start_periods=1:start_threshold=-50dB:'
+            f'stop_periods=-1:stop_duration={SILENCE_MIN_DURATION}:stop_threshold=-50dB'
+        )]
+    args += encoder_args
+    if codec == 'opus':
+        args += ['-b:a', settings.TRANSCRIPTION_AUDIO_BITRATE]
+    return args, extension
+
+
+def share_artifact(path, consumer):
+    """Give another stage its own name for an artifact
+
+    The new name is a hard link, so no data is copied and the file is only
+    freed once every stage has discarded its link.
+    """
+    stem, extension = os.path.splitext(path)
+    shared_path = f"{stem}.{consumer}{extension}"
+    if os.path.exists(shared_path):
+        os.remove(shared_path)
+    try:
+        os.link(path, shared_path)
+    except OSError:
+        # Filesystem without hard link support
+        shutil.copyfile(path, shared_path)
+    return shared_path
+
+
+def local_artifact(path):
+    """Path of an artifact when it exists on this host, None otherwise
+
+    Stages may run on another host than the one that demuxed their input
+    (MEDIA_WORK_ROOT not shared); they then read the original upload.
+    """
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+def discard_artifact(path):
+    """Remove a pipeline artifact and its work directory once it is empty"""
+    if path and os.path.exists(path):
+        os.remove(path)
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            # Other stages still have artifacts in this directory
+            pass
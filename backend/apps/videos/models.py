@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -17,8 +18,13 @@ class Video(models.Model):
     description = models.TextField(blank=True)
     video_file = models.FileField(upload_to='videos/')
     thumbnail = models.ImageField(upload_to='thumbnails/', blank=True, null=True)
+    sprite_sheet = models.ImageField(upload_to='sprites/', blank=True, null=True)
+    sprite_sheet_info = models.JSONField(blank=True, null=True)  # grid layout and tile timestamps
+    hls_playlist = models.CharField(max_length=255, blank=True)  # master.m3u8 in storage
     duration = models.DurationField(blank=True, null=True)
     file_size = models.BigIntegerField(blank=True, null=True)
+    # SHA-256 of the source as uploaded/downloaded (before compression)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
     transcription = models.TextField(blank=True)
     tags = models.ManyToManyField('Tag', blank=True)
@@ -33,6 +39,100 @@ class Video(models.Model):
         return self.title
 
 
+class VideoMetadata(models.Model):
+    """Technical facts about a video source, read once with ffprobe
+
+    Later stages and API validation read this record instead of opening
+    the media file again.
+    """
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='metadata')
+    duration = models.FloatField(help_text="Seconds")
+    file_size = models.BigIntegerField(help_text="Bytes")
+    bitrate = models.BigIntegerField(default=0, help_text="Overall bitrate in bits/s")
+    container = models.CharField(max_length=100, blank=True)
+    video_codec = models.CharField(max_length=32, blank=True)
+    audio_codec = models.CharField(max_length=32, blank=True)
+    pixel_format = models.CharField(max_length=32, blank=True)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    frame_rate = models.FloatField(default=0)
+    video_bitrate = models.BigIntegerField(default=0)
+    audio_bitrate = models.BigIntegerField(default=0)
+    has_audio = models.BooleanField(default=False)
+    probed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['duration']),
+            models.Index(fields=['file_size']),
+            models.Index(fields=['video_codec', 'height']),
+        ]
+
+    def __str__(self):
+        return f"{self.video.title} - {self.width}x{self.height} {self.video_codec}"
+
+    def as_probe(self):
+        """Return the record in the shape of apps.videos.media.probe_media()"""
+        return {
+            'duration': self.duration,
+            'file_size': self.file_size,
+            'bitrate': self.bitrate,
+            'container': self.container,
+            'video_codec': self.video_codec,
+            'audio_codec': self.audio_codec,
+            'pixel_format': self.pixel_format,
+            'width': self.width,
+            'height': self.height,
+            'frame_rate': self.frame_rate,
+            'video_bitrate': self.video_bitrate,
+            'audio_bitrate': self.audio_bitrate,
+            'has_video': True,
+            'has_audio': self.has_audio,
+        }
+
+
+class VideoAnalysis(models.Model):
+    """Content analysis of a video's transcription (the analyze_content stage)
+
+    The tags of the analysis are added to Video.tags.
+    """
+    SENTIMENT_CHOICES = [
+        ('positive', 'Positive'),
+        ('negative', 'Negative'),
+        ('neutral', 'Neutral'),
+    ]
+
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='analysis')
+    summary = models.TextField()
+    topics = models.JSONField(default=list)
+    sentiment = models.CharField(max_length=10, choices=SENTIMENT_CHOICES, default='neutral')
+    provider = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.video.title} - {self.sentiment}"
+
+
+class VideoTranscript(models.Model):
+    """Segment and word timestamps of a video's transcription
+
+    Stored as columns (apps/videos/transcripts.py): the texts joined with
+    newlines, and the start/end times as packed millisecond arrays.
+    """
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='transcript')
+    provider = models.CharField(max_length=20)
+    segment_text = models.TextField(blank=True)
+    segment_times = models.BinaryField(default=bytes)
+    word_text = models.TextField(blank=True)
+    word_times = models.BinaryField(default=bytes)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.video.title} - {self.provider}"
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -42,17 +142,28 @@ class Tag(models.Model):
 
 
 class VideoProcessingTask(models.Model):
+    # Stage names of apps/videos/pipeline.py
     TASK_TYPES = [
-        ('transcription', 'Transcription'),
-        ('thumbnail_generation', 'Thumbnail Generation'),
-        ('video_compression', 'Video Compression'),
-        ('content_analysis', 'Content Analysis'),
+        ('probe_media', 'Media Probe'),
+        ('generate_thumbnail', 'Thumbnail Generation'),
+        ('extract_transcription', 'Transcription'),
+        ('analyze_content', 'Content Analysis'),
+        ('compress_video', 'Video Compression'),
+        ('package_hls', 'HLS Packaging'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+        ('cancelled', 'Cancelled'),
     ]
 
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='processing_tasks')
     task_type = models.CharField(max_length=30, choices=TASK_TYPES)
     celery_task_id = models.CharField(max_length=255, blank=True, null=True)
-    status = models.CharField(max_length=20, default='pending')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     result = models.JSONField(blank=True, null=True)
     error_message = models.TextField(blank=True)
     started_at = models.DateTimeField(blank=True, null=True)
@@ -63,13 +174,51 @@ class VideoProcessingTask(models.Model):
         return f"{self.video.title} - {self.task_type}"
 
 
+class VideoRendition(models.Model):
+    """One variant of the adaptive-bitrate HLS ladder of a video"""
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=20)  # e.g. 480p
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    bitrate = models.PositiveIntegerField(help_text="Target video bitrate in bits/s")
+    playlist = models.CharField(max_length=255)  # variant index.m3u8 in storage
+    segment_paths = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['video', 'name']
+        ordering = ['height']
+
+    def __str__(self):
+        return f"{self.video.title} - {self.name}"
+
+
 class YouTubeDownload(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     youtube_url = models.URLField()
+    youtube_id = models.CharField(max_length=20, blank=True, db_index=True)
     video = models.OneToOneField(Video, on_delete=models.CASCADE, blank=True, null=True)
+    celery_task_id = models.CharField(max_length=255, blank=True, null=True)
     status = models.CharField(max_length=20, default='pending')
     error_message = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Download: {self.youtube_url}"
+
+
+class UploadSession(models.Model):
+    """Resumable chunked (tus-style) upload of a video file"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='upload_session')
+    filename = models.CharField(max_length=255)
+    upload_length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload: {self.filename} ({self.offset}/{self.upload_length})"
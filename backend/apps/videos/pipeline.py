@@ -0,0 +1,287 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from celery import chain, chord, group, signature
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .media import demux_media, discard_artifact, share_artifact
+from .models import Video, VideoProcessingTask
+
+# Statuses of stage attempts that are queued or running
+ACTIVE_STATUSES = ('pending', 'processing')
+
+
+class Stage:
+    """One node of the video processing graph
+
+    task: registered Celery task name, called as task(processing_task_id)
+        or task(processing_task_id, artifact_path) when artifact is set
+    depends_on: names of the stages that must complete first
+    artifact: demuxed artifact the stage reads ('audio' or 'source')
+    skip_if: callable(video) returning a reason to skip, checked when the
+        stage starts (so it sees the outputs of its dependencies)
+    required: the video is marked failed when this stage fails
+    """
+
+    def __init__(self, name, task, depends_on=(), artifact=None, skip_if=None, required=False):
+        self.name = name
+        self.task = task
+        self.depends_on = tuple(depends_on)
+        self.artifact = artifact
+        self.skip_if = skip_if
+        self.required = required
+
+    def __repr__(self):
+        return f"<Stage {self.name}>"
+
+
+def _no_transcription(video):
+    if not video.transcription:
+        return "Video has no transcription"
+    provider_keys = {
+        'openai': settings.OPENAI_API_KEY,
+        'gemini': settings.GEMINI_API_KEY,
+    }
+    if not provider_keys.get(settings.CONTENT_ANALYSIS_PROVIDER):
+        return f"Content analysis provider {settings.CONTENT_ANALYSIS_PROVIDER} is not configured"
+    return None
+
+
+def _hls_disabled(video):
+    return None if settings.HLS_ENABLED else "HLS packaging is disabled"
+
+
+# Stages in topological order: every stage comes after its dependencies
+PIPELINE = (
+    Stage('generate_thumbnail', 'apps.videos.tasks.generate_thumbnail', artifact='source'),
+    Stage('extract_transcription', 'apps.videos.tasks.extract_transcription', artifact='audio'),
+    Stage(
+        'analyze_content',
+        'apps.videos.tasks.analyze_content',
+        depends_on=('extract_transcription',),
+        skip_if=_no_transcription
+    ),
+    Stage('compress_video', 'apps.videos.tasks.compress_video', artifact='source', required=True),
+    Stage('package_hls', 'apps.videos.tasks.package_hls', artifact='source', skip_if=_hls_disabled),
+)
+
+STAGES = {stage.name: stage for stage in PIPELINE}
+
+
+def latest_statuses(video):
+    """Status of the most recent attempt of each stage of a video"""
+    statuses = {}
+    for task_type, status in video.processing_tasks.order_by('created_at').values_list('task_type', 'status'):
+        statuses[task_type] = status
+    return statuses
+
+
+def stages_to_run(video):
+    """Stages whose output is not cached, plus every stage downstream of them
+
+    A stage whose latest attempt completed, or was skipped by its own skip
+    condition, is not run again unless one of its dependencies runs again;
+    so a retry runs the failed stages and the stages they held back only.
+    """
+    statuses = latest_statuses(video)
+    pending = {stage.name for stage in PIPELINE if statuses.get(stage.name) not in ('completed', 'skipped')}
+    for stage in PIPELINE:
+        if pending.intersection(stage.depends_on):
+            pending.add(stage.name)
+    return [stage for stage in PIPELINE if stage.name in pending]
+
+
+def schedule(video, info=None, run_id=None):
+    """Demux what the pending stages need and dispatch them as a Celery workflow
+
+    Independent stages run in parallel, each followed by the stages that
+    depend on it only; stages joining several pending dependencies run
+    after all of them. finalize_pipeline runs last (chord callback).
+    run_id is the id of the run's probe_media task (see claim_video).
+    Returns the names of the scheduled stages.
+    """
+    stages = stages_to_run(video)
+    finalize = signature('apps.videos.tasks.finalize_pipeline', args=(video.id, run_id), immutable=True)
+    if not stages:
+        finalize.delay()
+        return []
+
+    inputs = _prepare_inputs(video, stages, info)
+
+    # Previous attempts of re-run stages are replaced
+    video.processing_tasks.filter(task_type__in=[stage.name for stage in stages]).delete()
+    task_ids = {
+        stage.name: VideoProcessingTask.objects.create(
+            video=video,
+            task_type=stage.name,
+            status='pending'
+        ).id
+        for stage in stages
+    }
+
+    def stage_signature(stage):
+        args = (task_ids[stage.name],)
+        if stage.artifact:
+            args += (inputs[stage.name],)
+        return signature(stage.task, args=args, immutable=True)
+
+    scheduled = set(task_ids)
+    joins = [stage for stage in stages if len(scheduled.intersection(stage.depends_on)) > 1]
+
+    def branch(stage):
+        children = [
+            child for child in stages
+            if child not in joins and stage.name in child.depends_on
+        ]
+        if not children:
+            return stage_signature(stage)
+        following = [branch(child) for child in children]
+        return chain(stage_signature(stage), following[0] if len(following) == 1 else group(following))
+
+    roots = [
+        stage for stage in stages
+        if stage not in joins and not scheduled.intersection(stage.depends_on)
+    ]
+    body = chain(*[stage_signature(stage) for stage in joins], finalize)
+    try:
+        chord(group([branch(stage) for stage in roots]), body).delay()
+    except Exception as e:
+        # Dispatch refused (broker unreachable): the attempts would stay
+        # pending and block retries until PIPELINE_CLAIM_TIMEOUT
+        VideoProcessingTask.objects.filter(id__in=task_ids.values()).update(
+            status='failed',
+            error_message=f"Could not dispatch stage: {e}",
+            completed_at=timezone.now()
+        )
+        for path in inputs.values():
+            discard_artifact(path)
+        raise
+    return [stage.name for stage in stages]
+
+
+def active_tasks(video):
+    """Stage attempts of a video that are queued or running
+
+    Attempts older than PIPELINE_CLAIM_TIMEOUT are treated as abandoned
+    (lost with a killed worker), so they cannot block the video forever.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PIPELINE_CLAIM_TIMEOUT)
+    return video.processing_tasks.filter(status__in=ACTIVE_STATUSES, created_at__gte=cutoff)
+
+
+def claim_video(video_id, celery_task_id):
+    """Claim a video for one process_video run
+
+    The video row is locked with SKIP LOCKED, so of two concurrent runs one
+    gets the claim and the other returns at once. A video with queued or
+    running stages is not claimed again, except by a redelivery of the
+    same Celery message. Returns the run's probe_media task (the claim),
+    or None for a duplicate run.
+    """
+    with transaction.atomic():
+        video = Video.objects.select_for_update(skip_locked=True).filter(id=video_id).first()
+        if video is None:
+            return None
+
+        active = active_tasks(video)
+        redelivered = active.filter(task_type='probe_media', celery_task_id=celery_task_id).first()
+        if redelivered:
+            return redelivered
+        if active.exists():
+            return None
+
+        video.processing_tasks.filter(task_type='probe_media').delete()
+        return VideoProcessingTask.objects.create(
+            video=video,
+            task_type='probe_media',
+            celery_task_id=celery_task_id,
+            status='processing',
+            started_at=timezone.now()
+        )
+
+
+def claim_stage(task_id, celery_task_id):
+    """Claim a pending stage attempt for the Celery message running it
+
+    The task id is the idempotency key of a stage: the row is locked with
+    SKIP LOCKED and only a pending attempt (or one claimed by this same
+    message, when the broker redelivers it) is handed out. Returns the
+    claimed task, or None for a duplicate delivery or a replaced attempt.
+    """
+    with transaction.atomic():
+        task = (
+            # of=self: only the task row is locked, not the joined video row
+            # that sibling stages update while they run
+            VideoProcessingTask.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('video')
+            .filter(id=task_id)
+            .first()
+        )
+        if task is None:
+            return None
+        redelivered = task.status == 'processing' and task.celery_task_id == celery_task_id
+        if task.status != 'pending' and not redelivered:
+            return None
+
+        task.status = 'processing'
+        task.celery_task_id = celery_task_id
+        task.started_at = timezone.now()
+        task.save()
+    return task
+
+
+def start_stage(task):
+    """Check that a claimed stage attempt may run, marking it skipped if not
+
+    Returns False for skipped stages: a dependency did not complete or the
+    stage's skip condition applies.
+    """
+    stage = STAGES.get(task.task_type)
+    reason = None
+    if stage:
+        statuses = latest_statuses(task.video)
+        blocked = [name for name in stage.depends_on if statuses.get(name) != 'completed']
+        if blocked:
+            reason = f"Skipped: {', '.join(blocked)} did not complete"
+        elif stage.skip_if:
+            reason = stage.skip_if(task.video)
+
+    if reason:
+        task.status = 'skipped'
+        task.error_message = reason
+        task.completed_at = timezone.now()
+        task.save()
+        return False
+    return True
+
+
+def _prepare_inputs(video, stages, info):
+    """Demux the source once for all pending stages; give each its own artifact link"""
+    needed = tuple(sorted({stage.artifact for stage in stages if stage.artifact}))
+    if not needed:
+        return {}
+
+    os.makedirs(settings.MEDIA_WORK_ROOT, exist_ok=True)
+    # Unique per run: artifacts outlive this task, so they cannot use a
+    # per-task scratch space. Each stage discards its own link and the
+    # directory disappears with the last one.
+    work_dir = tempfile.mkdtemp(prefix=f"{video.id}-", dir=settings.MEDIA_WORK_ROOT)
+    try:
+        artifacts = demux_media(video.video_file.path, work_dir, outputs=needed, info=info)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    # Links are made before anything is dispatched, so no stage can
+    # discard an artifact another stage still needs
+    inputs = {}
+    for stage in stages:
+        if stage.artifact:
+            artifact = artifacts.get(stage.artifact)
+            inputs[stage.name] = share_artifact(artifact, stage.name) if artifact else None
+
+    for name in needed:
+        discard_artifact(artifacts.get(name))
+    return inputs
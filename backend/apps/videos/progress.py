@@ -0,0 +1,121 @@
+import json
+import time
+import redis
+import redis.asyncio
+from django.conf import settings
+from .redis_client import get_redis
+
+CHANNEL_PREFIX = 'progress:video'
+
+# Video statuses after which no more progress is published
+FINAL_STATUSES = ('ready', 'failed')
+
+
+def channel_name(video_id):
+    """Redis pub/sub channel carrying the progress of one video"""
+    return f"{CHANNEL_PREFIX}:{video_id}"
+
+
+def publish_progress(video_id, event, **data):
+    """Publish a progress event of a video to its subscribers
+
+    Best effort: progress is only a notification (the database remains the
+    source of truth), so a Redis outage never fails the processing task.
+    """
+    message = json.dumps({'event': event, 'video_id': video_id, **data}, default=str)
+    try:
+        get_redis().publish(channel_name(video_id), message)
+    except redis.RedisError:
+        pass
+
+
+def format_event(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_progress(video_ids, snapshot=(), heartbeat=None, max_duration=None):
+    """Server-Sent Events stream of the progress of video_ids
+
+    Starts with the snapshot events, then relays everything published for
+    the videos until all of them reached a final status or max_duration
+    passed (the browser's EventSource reconnects by itself). A comment line
+    is sent every heartbeat seconds so proxies keep the connection open.
+
+    Holds a server thread while open; astream_progress() is the variant
+    for ASGI servers.
+    """
+    heartbeat = heartbeat or settings.PROGRESS_STREAM_HEARTBEAT
+    max_duration = max_duration or settings.PROGRESS_STREAM_MAX_DURATION
+    pending = set(video_ids)
+
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    # Subscribe before the snapshot is sent, so nothing falls in between
+    pubsub.subscribe(*[channel_name(video_id) for video_id in video_ids])
+    try:
+        yield from _opening_events(snapshot, pending)
+
+        started = last_sent = time.monotonic()
+        while pending and time.monotonic() - started < max_duration:
+            message = pubsub.get_message(timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+
+            last_sent = time.monotonic()
+            yield _relayed_event(message, pending)
+    finally:
+        pubsub.close()
+
+
+async def astream_progress(video_ids, snapshot=(), heartbeat=None, max_duration=None):
+    """Asynchronous stream_progress() for ASGI servers
+
+    Waits for messages on the event loop, so an open stream costs a
+    coroutine and a Redis connection instead of a server thread.
+    """
+    heartbeat = heartbeat or settings.PROGRESS_STREAM_HEARTBEAT
+    max_duration = max_duration or settings.PROGRESS_STREAM_MAX_DURATION
+    pending = set(video_ids)
+
+    # Async connections belong to the event loop of the stream
+    client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(*[channel_name(video_id) for video_id in video_ids])
+        for event in _opening_events(snapshot, pending):
+            yield event
+
+        started = last_sent = time.monotonic()
+        while pending and time.monotonic() - started < max_duration:
+            message = await pubsub.get_message(timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+
+            last_sent = time.monotonic()
+            yield _relayed_event(message, pending)
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+def _opening_events(snapshot, pending):
+    """Reconnect delay and snapshot events; final videos leave pending"""
+    yield f"retry: {settings.PROGRESS_STREAM_RETRY_MS}\n\n"
+    for event, data in snapshot:
+        if data.get('status') in FINAL_STATUSES:
+            pending.discard(data['video_id'])
+        yield format_event(event, data)
+
+
+def _relayed_event(message, pending):
+    """SSE message of a published progress message; final videos leave pending"""
+    data = json.loads(message['data'])
+    if data['event'] == 'video' and data.get('status') in FINAL_STATUSES:
+        pending.discard(data['video_id'])
+    return format_event(data.pop('event'), data)
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Video, Tag, VideoProcessingTask, YouTubeDownload
+from .models import (
+    Video, Tag, VideoAnalysis, VideoMetadata, VideoProcessingTask, VideoRendition, YouTubeDownload
+)
+from .tagging import set_video_tags
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -8,8 +11,32 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'created_at')
 
 
+class VideoRenditionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoRendition
+        fields = ('id', 'name', 'width', 'height', 'bitrate', 'playlist')
+
+
+class VideoMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoMetadata
+        fields = (
+            'duration', 'file_size', 'bitrate', 'container', 'video_codec',
+            'audio_codec', 'width', 'height', 'frame_rate', 'has_audio'
+        )
+
+
+class VideoAnalysisSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoAnalysis
+        fields = ('summary', 'topics', 'sentiment', 'provider', 'updated_at')
+
+
 class VideoSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
+    renditions = VideoRenditionSerializer(many=True, read_only=True)
+    metadata = VideoMetadataSerializer(read_only=True)
+    analysis = VideoAnalysisSerializer(read_only=True)
     tag_names = serializers.ListField(
         child=serializers.CharField(max_length=50), 
         write_only=True, 
@@ -20,11 +47,14 @@ class VideoSerializer(serializers.ModelSerializer):
         model = Video
         fields = (
             'id', 'title', 'description', 'video_file', 'thumbnail', 
-            'duration', 'file_size', 'status', 'transcription', 'tags', 
-            'tag_names', 'is_public', 'created_at', 'updated_at'
+            'sprite_sheet', 'sprite_sheet_info', 'hls_playlist', 'renditions',
+            'metadata', 'analysis', 'duration', 'file_size', 'status',
+            'transcription', 'tags', 'tag_names', 'is_public', 'created_at',
+            'updated_at'
         )
         read_only_fields = (
-            'id', 'thumbnail', 'duration', 'file_size', 'status', 
+            'id', 'thumbnail', 'sprite_sheet', 'sprite_sheet_info', 'hls_playlist',
+            'duration', 'file_size', 'status', 
             'transcription', 'created_at', 'updated_at'
         )
 
@@ -32,10 +62,7 @@ class VideoSerializer(serializers.ModelSerializer):
         tag_names = validated_data.pop('tag_names', [])
         video = Video.objects.create(**validated_data)
         
-        # Create or get tags
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(name=tag_name.strip().lower())
-            video.tags.add(tag)
+        set_video_tags(video, tag_names)
         
         return video
 
@@ -49,10 +76,7 @@ class VideoSerializer(serializers.ModelSerializer):
         
         # Update tags if provided
         if tag_names is not None:
-            instance.tags.clear()
-            for tag_name in tag_names:
-                tag, created = Tag.objects.get_or_create(name=tag_name.strip().lower())
-                instance.tags.add(tag)
+            set_video_tags(instance, tag_names)
         
         return instance
 
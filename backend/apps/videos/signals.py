@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Video, VideoProcessingTask
+from .progress import publish_progress
+
+
+@receiver(post_save, sender=VideoProcessingTask)
+def publish_task_status(sender, instance, **kwargs):
+    """Push every stage status change to the video's progress channel"""
+    publish_progress(
+        instance.video_id,
+        'task',
+        stage=instance.task_type,
+        status=instance.status,
+        error_message=instance.error_message,
+    )
+
+
+@receiver(post_save, sender=Video)
+def publish_video_status(sender, instance, **kwargs):
+    """Push the overall video status to the video's progress channel"""
+    publish_progress(instance.id, 'video', status=instance.status)
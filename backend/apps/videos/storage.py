@@ -0,0 +1,55 @@
+import os
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+def store_file(name, local_path, move=True):
+    """Save a local file through default_storage without loading it into memory
+
+    On a filesystem storage the file is handed over with a hard link (a
+    rename when move=True), so no bytes are copied at all when source and
+    destination share a filesystem. Otherwise the file is streamed to the
+    storage from an open handle in chunks. Returns the stored name.
+    """
+    try:
+        default_storage.path(name)
+    except NotImplementedError:
+        # Remote storage (e.g. S3): stream from the file handle
+        return _stream_file(name, local_path, move)
+
+    name = default_storage.get_available_name(name)
+    target_path = default_storage.path(name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    try:
+        # link() never overwrites, unlike rename()
+        os.link(local_path, target_path)
+    except OSError:
+        # Different filesystem (or no hard link support)
+        return _stream_file(name, local_path, move)
+
+    if default_storage.file_permissions_mode is not None:
+        os.chmod(target_path, default_storage.file_permissions_mode)
+    if move:
+        os.remove(local_path)
+    return name
+
+
+def store_field_file(field_file, name, local_path, move=True, save=True):
+    """FieldFile.save() counterpart of store_file, applying the field's upload_to"""
+    name = field_file.field.generate_filename(field_file.instance, name)
+    field_file.name = store_file(name, local_path, move=move)
+    setattr(field_file.instance, field_file.field.attname, field_file.name)
+    field_file._committed = True
+
+    if save:
+        field_file.instance.save()
+    return field_file.name
+
+
+def _stream_file(name, local_path, move):
+    with open(local_path, 'rb') as f:
+        name = default_storage.save(name, File(f))
+    if move:
+        os.remove(local_path)
+    return name
@@ -0,0 +1,35 @@
+from django.db import transaction
+from .models import Tag, Video
+
+TAG_MAX_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def normalize_tag_names(names):
+    """Stripped, lowercased, de-duplicated tag names (order kept, invalid ones dropped)"""
+    normalized = {}
+    for name in names:
+        name = str(name).strip().lower()
+        if name and len(name) <= TAG_MAX_LENGTH:
+            normalized.setdefault(name)
+    return list(normalized)
+
+
+def set_video_tags(video, names, replace=True):
+    """Tag a video with names in a fixed number of queries
+
+    Missing tags are inserted in one statement and the video/tag links in
+    another, whatever the number of tags. replace=False keeps the tags the
+    video already has. Bulk writes send no m2m_changed signals.
+    """
+    names = normalize_tag_names(names)
+    links = Video.tags.through
+    with transaction.atomic():
+        if names:
+            Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = list(Tag.objects.filter(name__in=names).values_list('id', flat=True)) if names else []
+        if replace:
+            links.objects.filter(video_id=video.id).exclude(tag_id__in=tag_ids).delete()
+        links.objects.bulk_create(
+            [links(video_id=video.id, tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True
+        )
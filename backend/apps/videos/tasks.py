@@ -1,44 +1,74 @@
 from celery import shared_task
-from django.core.files.base import ContentFile
+from django.conf import settings
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 import yt_dlp
-import moviepy.editor as mp
-from moviepy.video.fx import resize
 import os
-import tempfile
-from .models import Video, VideoProcessingTask, YouTubeDownload
-from apps.ai_processing.services import TranscriptionService
-
-
-@shared_task
-def download_youtube_video(download_id):
+import time
+from .models import Video, VideoMetadata, VideoProcessingTask, VideoRendition, YouTubeDownload
+from .dedup import (
+    extract_youtube_id, find_processed_duplicate, find_processed_youtube_video,
+    hash_file, reuse_processed_media
+)
+from .fairshare import FairShareScheduler, processing_key, release_processing, submit_processing
+from .media import discard_artifact, local_artifact, probe_media
+from .pipeline import (
+    PIPELINE, active_tasks, claim_stage, claim_video, latest_statuses, schedule, start_stage
+)
+from .progress import publish_progress
+from .storage import store_field_file, store_file
+from .thumbnails import ThumbnailEngine
+from .transcode import TranscodeEngine
+from .transcripts import save_transcript
+from .workspace import ScratchSpace
+from apps.ai_processing.analysis import load_analysis, save_video_analysis
+from apps.ai_processing.services import ContentAnalysisService, TranscriptionService
+
+
+@shared_task(bind=True)
+def download_youtube_video(self, download_id):
     """Download video from YouTube using yt-dlp"""
+    download = _claim_download(download_id, self.request.id)
+    if download is None:
+        # Duplicate delivery, another worker is downloading it
+        return
     try:
-        download = YouTubeDownload.objects.get(id=download_id)
-        download.status = 'processing'
+        download.youtube_id = extract_youtube_id(download.youtube_url) or ''
         download.save()
 
-        # Configure yt-dlp options
-        ydl_opts = {
-            'format': 'best[height<=720]',  # Limit to 720p
-            'outtmpl': f'/tmp/%(title)s.%(ext)s',
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Extract video info
-            info = ydl.extract_info(download.youtube_url, download=False)
-            title = info.get('title', 'Downloaded Video')
-            description = info.get('description', '')
-            duration = info.get('duration', 0)
-
-            # Download the video
-            ydl.download([download.youtube_url])
-
-            # Find the downloaded file
+        with ScratchSpace('youtube') as scratch:
+            # Configure yt-dlp options
+            ydl_opts = {
+                'format': 'best[height<=720]',  # Limit to 720p
+                'outtmpl': scratch.file('source.%(ext)s'),
+                'max_filesize': scratch.quota,
+            }
+
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # Extract video info
+                info = ydl.extract_info(download.youtube_url, download=False)
+                title = info.get('title', 'Downloaded Video')
+                description = info.get('description', '')
+                duration = info.get('duration', 0)
+
+                if not download.youtube_id and info.get('id'):
+                    download.youtube_id = info['id']
+                    download.save()
+
+                # Same YouTube video already downloaded and processed: skip the download
+                if _reuse_youtube_download(download, title, description):
+                    return
+
+                # Download the video
+                ydl.download([download.youtube_url])
+
+            # The scratch directory is private, so any video file in it is ours
             video_path = None
-            for file in os.listdir('/tmp'):
-                if title in file and file.endswith(('.mp4', '.webm', '.mkv')):
-                    video_path = os.path.join('/tmp', file)
+            for file in os.listdir(scratch.path):
+                if file.endswith(('.mp4', '.webm', '.mkv')):
+                    video_path = scratch.file(file)
                     break
 
             if video_path and os.path.exists(video_path):
@@ -50,16 +80,8 @@ def download_youtube_video(download_id):
                     status='processing'
                 )
 
-                # Save video file
-                with open(video_path, 'rb') as f:
-                    video.video_file.save(
-                        f"{video.id}.mp4",
-                        ContentFile(f.read()),
-                        save=True
-                    )
-
-                # Clean up temporary file
-                os.remove(video_path)
+                # Hand the downloaded file over to storage (moves it)
+                store_field_file(video.video_file, f"{video.id}.mp4", video_path)
 
                 # Update download record
                 download.video = video
@@ -67,7 +89,7 @@ def download_youtube_video(download_id):
                 download.save()
 
                 # Start video processing tasks
-                process_video.delay(video.id)
+                submit_processing(video)
 
             else:
                 download.status = 'failed'
@@ -80,74 +102,204 @@ def download_youtube_video(download_id):
         download.save()
 
 
-@shared_task
-def process_video(video_id):
+def _claim_download(download_id, celery_task_id):
+    """Claim a pending download (or this message's own, when redelivered)"""
+    with transaction.atomic():
+        download = YouTubeDownload.objects.select_for_update(skip_locked=True).filter(id=download_id).first()
+        if download is None:
+            return None
+        redelivered = download.status == 'processing' and download.celery_task_id == celery_task_id
+        if download.status != 'pending' and not redelivered:
+            return None
+
+        download.status = 'processing'
+        download.celery_task_id = celery_task_id
+        download.save()
+    return download
+
+
+def _reuse_youtube_download(download, title, description):
+    """Complete a download from an already processed copy of the same YouTube video
+
+    Only the media is shared: title and description come from YouTube, not
+    from the other user's video.
+    """
+    source = find_processed_youtube_video(download.youtube_id)
+    if not source:
+        return False
+
+    video = Video.objects.create(
+        user=download.user,
+        title=title,
+        description=description[:500],  # Limit description length
+        status='processing'
+    )
+    reuse_processed_media(video, source)
+
+    download.video = video
+    download.status = 'completed'
+    download.save()
+    return True
+
+
+@shared_task(bind=True)
+def process_video(self, video_id, user_id=None):
     """Process uploaded video - generate thumbnail, compress, etc."""
+    # The run's probe_media task is its claim on the video: a duplicate
+    # run (double dispatch, retry racing an in-flight pipeline) stops here
+    probe_task = claim_video(video_id, self.request.id)
+    if probe_task is None:
+        _release_unclaimed(video_id, user_id)
+        return
+
+    video = probe_task.video
+    handed_off = False
     try:
-        video = Video.objects.get(id=video_id)
         video.status = 'processing'
         video.save()
 
-        # Create processing tasks
-        tasks = [
-            'generate_thumbnail',
-            'extract_transcription',
-            'compress_video'
-        ]
-
-        for task_type in tasks:
-            task = VideoProcessingTask.objects.create(
-                video=video,
-                task_type=task_type,
-                status='pending'
-            )
-
-            # Start the specific task
-            if task_type == 'generate_thumbnail':
-                generate_thumbnail.delay(task.id)
-            elif task_type == 'extract_transcription':
-                extract_transcription.delay(task.id)
-            elif task_type == 'compress_video':
-                compress_video.delay(task.id)
+        # Read headers first so oversized or over-long files are rejected
+        # before any decoding happens
+        info = _probe_video(video, probe_task)
+        if info is None:
+            return
+
+        # Identical media already went through the pipeline: reuse its outputs
+        if not video.content_hash:
+            video.content_hash = hash_file(video.video_file.path)
+            video.save()
+        source = find_processed_duplicate(video.content_hash, exclude_id=video.id)
+        if source:
+            reuse_processed_media(video, source)
+            return
+
+        # Run every stage whose output is not cached yet; see apps/videos/pipeline.py
+        schedule(video, info, run_id=probe_task.id)
+        # finalize_pipeline frees the fair-share slot from here on
+        handed_off = True
 
     except Exception as e:
+        if probe_task.status == 'processing':
+            probe_task.status = 'failed'
+            probe_task.error_message = str(e)
+            probe_task.save()
+
+        video.status = 'failed'
+        video.save()
+
+    finally:
+        if not handed_off:
+            release_processing(video)
+
+
+def _release_unclaimed(video_id, user_id):
+    """Free the fair-share slot of a run that had nothing to claim
+
+    A run holding the video frees the slot itself (finalize_pipeline), so
+    it is only released when the video is gone or has no active run.
+    """
+    with transaction.atomic():
+        # Waits for a concurrent claim to commit, so its run is seen
+        video = Video.objects.select_for_update().filter(id=video_id).first()
+        if video is not None and active_tasks(video).exists():
+            return
+    if video is not None:
+        release_processing(video)
+    elif user_id is not None:
+        FairShareScheduler().release(user_id, processing_key(video_id))
+
+
+def _probe_video(video, task):
+    """Probe the source, store its metadata record and enforce size/duration limits
+
+    Returns the probe result, or None when the video was rejected.
+    """
+    info = probe_media(video.video_file.path)
+
+    VideoMetadata.objects.update_or_create(
+        video=video,
+        defaults={
+            'duration': info['duration'],
+            'file_size': info['file_size'],
+            'bitrate': info['bitrate'],
+            'container': info['container'],
+            'video_codec': info['video_codec'],
+            'audio_codec': info['audio_codec'],
+            'pixel_format': info['pixel_format'],
+            'width': info['width'],
+            'height': info['height'],
+            'frame_rate': info['frame_rate'],
+            'video_bitrate': info['video_bitrate'],
+            'audio_bitrate': info['audio_bitrate'],
+            'has_audio': info['has_audio'],
+        }
+    )
+    video.duration = timedelta(seconds=info['duration'])
+    video.file_size = info['file_size']
+    video.save()
+
+    error = None
+    if not info['has_video']:
+        error = "No video track found in video"
+    elif info['file_size'] > settings.MAX_VIDEO_SIZE:
+        error = f"File size cannot exceed {settings.MAX_VIDEO_SIZE // (1024 * 1024)}MB"
+    elif info['duration'] > settings.MAX_VIDEO_DURATION:
+        error = f"Video cannot be longer than {settings.MAX_VIDEO_DURATION} seconds"
+
+    task.status = 'failed' if error else 'completed'
+    task.error_message = error or ''
+    task.result = info
+    task.completed_at = timezone.now()
+    task.save()
+
+    if error:
         video.status = 'failed'
         video.save()
+        return None
+    return info
 
 
-@shared_task
-def generate_thumbnail(task_id):
-    """Generate thumbnail from video"""
+def _stored_probe(video):
+    """Probe result recorded by process_video, so stages need not probe again"""
     try:
-        task = VideoProcessingTask.objects.get(id=task_id)
-        task.status = 'processing'
-        task.save()
+        return video.metadata.as_probe()
+    except VideoMetadata.DoesNotExist:
+        return None
+
+
+@shared_task(bind=True)
+def generate_thumbnail(self, task_id, source_path=None):
+    """Generate thumbnail and scrubbing sprite sheet from video"""
+    task = claim_stage(task_id, self.request.id)
+    if task is None:
+        # Duplicate delivery: the worker holding the claim owns the artifact
+        return
+    try:
+        if not start_stage(task):
+            return
 
         video = task.video
-        video_path = video.video_file.path
-
-        # Use MoviePy to extract frame at 10% of video duration
-        with mp.VideoFileClip(video_path) as clip:
-            # Get frame at 10% of duration or 1 second, whichever is smaller
-            time = min(clip.duration * 0.1, 1.0)
-            frame = clip.get_frame(time)
 
-            # Save thumbnail
-            thumbnail_path = f"/tmp/thumbnail_{video.id}.jpg"
-            mp.ImageClip(frame).save_frame(thumbnail_path)
+        with ScratchSpace('thumbnail') as scratch:
+            # Score sampled keyframes and keep the best one
+            selection = ThumbnailEngine().select(
+                local_artifact(source_path) or video.video_file.path,
+                scratch.path,
+                info=_stored_probe(video)
+            )
 
             # Save to model
-            with open(thumbnail_path, 'rb') as f:
-                video.thumbnail.save(
-                    f"thumb_{video.id}.jpg",
-                    ContentFile(f.read()),
-                    save=True
-                )
-
-            # Clean up
-            os.remove(thumbnail_path)
+            store_field_file(video.thumbnail, f"thumb_{video.id}.jpg", selection['thumbnail'], save=False)
+            store_field_file(video.sprite_sheet, f"sprite_{video.id}.jpg", selection['sprite'], save=False)
+            video.sprite_sheet_info = selection['sprite_info']
+            video.save(update_fields=['thumbnail', 'sprite_sheet', 'sprite_sheet_info'])
 
         task.status = 'completed'
+        task.result = {
+            'timestamp': selection['timestamp'],
+            'score': selection['score'],
+            'samples': len(selection['sprite_info']['timestamps']),
+        }
         task.save()
 
     except Exception as e:
@@ -155,26 +307,47 @@ def generate_thumbnail(task_id):
         task.error_message = str(e)
         task.save()
 
+    finally:
+        discard_artifact(source_path)
 
-@shared_task
-def extract_transcription(task_id):
+
+@shared_task(bind=True)
+def extract_transcription(self, task_id, audio_path=None):
     """Extract transcription from video using AI services"""
+    task = claim_stage(task_id, self.request.id)
+    if task is None:
+        # Duplicate delivery: the worker holding the claim owns the artifact
+        return
     try:
-        task = VideoProcessingTask.objects.get(id=task_id)
-        task.status = 'processing'
-        task.save()
+        if not start_stage(task):
+            return
 
         video = task.video
         
         # Use AI service to transcribe
         transcription_service = TranscriptionService()
-        transcription = transcription_service.transcribe_video(video.video_file.path)
+        if local_artifact(audio_path):
+            # Audio track already demuxed by process_video; long audio is
+            # transcribed in parallel chunks
+            try:
+                transcript = transcription_service.transcribe(audio_path, settings.TRANSCRIPTION_PROVIDER)
+            finally:
+                discard_artifact(audio_path)
+        else:
+            transcript = transcription_service.video_transcript(
+                video.video_file.path,
+                settings.TRANSCRIPTION_PROVIDER
+            )
 
-        video.transcription = transcription
-        video.save()
+        # Timestamps go to the video's transcript columns, not the task result
+        save_transcript(video, transcript, settings.TRANSCRIPTION_PROVIDER)
 
         task.status = 'completed'
-        task.result = {'transcription': transcription}
+        task.result = {
+            'transcription': transcript['text'],
+            'segments': len(transcript['segments']),
+            'words': len(transcript['words']),
+        }
         task.save()
 
     except Exception as e:
@@ -183,49 +356,155 @@ def extract_transcription(task_id):
         task.save()
 
 
-@shared_task
-def compress_video(task_id):
+@shared_task(bind=True)
+def compress_video(self, task_id, source_path=None):
     """Compress video for better performance"""
+    task = claim_stage(task_id, self.request.id)
+    if task is None:
+        # Duplicate delivery: the worker holding the claim owns the artifact
+        return
     try:
-        task = VideoProcessingTask.objects.get(id=task_id)
-        task.status = 'processing'
+        if not start_stage(task):
+            return
+
+        video = task.video
+        # Transcode from the demuxed copy so the original file can be
+        # replaced while other stages are still running
+        video_path = local_artifact(source_path) or video.video_file.path
+
+        with ScratchSpace('compress') as scratch:
+            # Compress and save; ffmpeg streams the file itself and reports
+            # progress, which is stored on the task as it arrives
+            compressed_path = scratch.file('compressed.mp4')
+            # Compliant sources are only remuxed (see TranscodeEngine.choose_mode)
+            stats = TranscodeEngine().transcode(
+                video_path,
+                compressed_path,
+                info=_stored_probe(video),
+                on_progress=_progress_recorder(task),
+                max_size=scratch.quota
+            )
+            scratch.check_quota()
+            video.file_size = os.path.getsize(compressed_path)
+
+            # Replace original with compressed version (moves the output)
+            store_field_file(
+                video.video_file,
+                os.path.basename(video.video_file.name),
+                compressed_path
+            )
+
+        # The final status is set by finalize_pipeline once every stage ran
+        video.save(update_fields=['video_file', 'file_size'])
+
+        task.status = 'completed'
+        task.result = {'progress': stats}
+        task.save()
+
+    except Exception as e:
+        task.status = 'failed'
+        task.error_message = str(e)
         task.save()
 
+        # Mark video as failed (required stage)
         video = task.video
-        video_path = video.video_file.path
+        video.status = 'failed'
+        video.save(update_fields=['status'])
 
-        # Create compressed version
-        with mp.VideoFileClip(video_path) as clip:
-            # Resize if too large
-            if clip.h > 720:
-                clip = resize(clip, height=720)
+    finally:
+        discard_artifact(source_path)
 
-            # Compress and save
-            compressed_path = f"/tmp/compressed_{video.id}.mp4"
-            clip.write_videofile(
-                compressed_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='/tmp/temp-audio.m4a',
-                remove_temp=True
-            )
 
-            # Replace original with compressed version
-            with open(compressed_path, 'rb') as f:
-                video.video_file.save(
-                    video.video_file.name,
-                    ContentFile(f.read()),
-                    save=True
+@shared_task(bind=True)
+def package_hls(self, task_id, source_path=None):
+    """Package the video as an adaptive-bitrate HLS ladder"""
+    task = claim_stage(task_id, self.request.id)
+    if task is None:
+        # Duplicate delivery: the worker holding the claim owns the artifact
+        return
+    try:
+        if not start_stage(task):
+            return
+
+        video = task.video
+        video_path = local_artifact(source_path) or video.video_file.path
+
+        with ScratchSpace('hls') as scratch:
+            master_path, renditions = TranscodeEngine().package_hls(
+                video_path,
+                scratch.path,
+                info=_stored_probe(video),
+                on_progress=_progress_recorder(task),
+                max_size=scratch.quota
+            )
+            scratch.check_quota()
+
+            # Publish playlists and segments under the same relative layout so
+            # the URIs written by ffmpeg keep resolving
+            storage_root = f"hls/{video.id}"
+
+            def publish(path):
+                name = f"{storage_root}/{os.path.relpath(path, scratch.path)}"
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                return store_file(name, path)
+
+            video.renditions.all().delete()
+            VideoRendition.objects.bulk_create([
+                VideoRendition(
+                    video=video,
+                    name=rendition['name'],
+                    width=rendition['width'],
+                    height=rendition['height'],
+                    bitrate=rendition['bitrate'],
+                    playlist=publish(rendition['playlist']),
+                    segment_paths=[publish(segment) for segment in rendition['segments']],
                 )
+                for rendition in renditions
+            ])
+            video.hls_playlist = publish(master_path)
+            # Only this stage's field: the instance predates the sibling
+            # stages, a full save would revert their outputs
+            video.save(update_fields=['hls_playlist'])
 
-            # Clean up
-            os.remove(compressed_path)
+        task.status = 'completed'
+        task.result = {
+            'master_playlist': video.hls_playlist,
+            'renditions': [rendition['name'] for rendition in renditions],
+        }
+        task.save()
 
-        # Mark video as ready
-        video.status = 'ready'
-        video.save()
+    except Exception as e:
+        task.status = 'failed'
+        task.error_message = str(e)
+        task.save()
+
+    finally:
+        discard_artifact(source_path)
+
+
+@shared_task(bind=True)
+def analyze_content(self, task_id):
+    """Analyze transcribed content (summary, tags, topics, sentiment) using AI services"""
+    task = claim_stage(task_id, self.request.id)
+    if task is None:
+        # Duplicate delivery, the stage is already claimed
+        return
+    try:
+        if not start_stage(task):
+            return
+
+        video = task.video
+
+        analysis_service = ContentAnalysisService()
+        analysis = load_analysis(analysis_service.analyze_content(
+            video.transcription,
+            provider=settings.CONTENT_ANALYSIS_PROVIDER
+        ))
+        save_video_analysis(video, analysis, settings.CONTENT_ANALYSIS_PROVIDER)
 
         task.status = 'completed'
+        task.result = {'analysis': analysis}
         task.save()
 
     except Exception as e:
@@ -233,7 +512,68 @@ def compress_video(task_id):
         task.error_message = str(e)
         task.save()
 
-        # Mark video as failed
-        video = task.video
-        video.status = 'failed'
-        video.save()
+
+@shared_task
+def finalize_pipeline(video_id, run_id=None):
+    """Set the final video status once every scheduled stage has finished
+
+    run_id: probe_media task id of the run that scheduled this callback
+    """
+    video = Video.objects.get(id=video_id)
+    if run_id is not None and not video.processing_tasks.filter(id=run_id).exists():
+        # Callback of a superseded run (claim_video replaced its probe task);
+        # the current run finalizes itself
+        return
+
+    # Every stage message of the run has returned: attempts still queued or
+    # running were never claimed or were lost, and will not finish now
+    for task in active_tasks(video).exclude(task_type='probe_media'):
+        task.status = 'failed'
+        task.error_message = "Stage did not run to completion"
+        task.completed_at = timezone.now()
+        task.save()
+
+    release_processing(video)
+    if video.status != 'processing':
+        # Cancelled, or already marked by a required stage
+        return
+
+    required = [stage.name for stage in PIPELINE if stage.required]
+    statuses = latest_statuses(video)
+    failed = [name for name in required if statuses.get(name) != 'completed']
+
+    video.status = 'failed' if failed else 'ready'
+    video.save()
+
+
+@shared_task(ignore_result=True)
+def dispatch_fair_share():
+    """Periodically hand queued jobs to Celery, e.g. after leases expired"""
+    FairShareScheduler().dispatch()
+
+
+def _progress_recorder(task, min_interval=2.0, publish_interval=0.5):
+    """Build an on_progress callback that publishes transcode progress and stores it on the task"""
+    last_write = [0.0]
+    last_publish = [0.0]
+
+    def record(progress):
+        now = time.monotonic()
+        # Subscribers get updates more often than the database
+        if progress['done'] or now - last_publish[0] >= publish_interval:
+            last_publish[0] = now
+            publish_progress(
+                task.video_id,
+                'task',
+                stage=task.task_type,
+                status='processing',
+                percent=progress['percent'],
+                progress=progress
+            )
+        if not progress['done'] and now - last_write[0] < min_interval:
+            return
+        last_write[0] = now
+        # Update only the result column so concurrent status writes are kept
+        VideoProcessingTask.objects.filter(id=task.id).update(result={'progress': progress})
+
+    return record
@@ -0,0 +1,175 @@
+import os
+import re
+import subprocess
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from .media import MediaProcessingError, probe_media
+
+PTS_TIME_PATTERN = re.compile(r'pts_time:\s*(-?[\d.]+)')
+
+# ITU-R BT.601 luma weights
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Frames darker/brighter than this (mean luma, 0-1) are never picked
+MIN_BRIGHTNESS = 0.08
+MAX_BRIGHTNESS = 0.95
+
+
+class ThumbnailEngine:
+    """Pick a representative thumbnail and build a sprite sheet for scrubbing
+
+    Up to sample_count evenly spaced keyframes are decoded at low resolution
+    in a single ffmpeg pass (non-key frames are skipped by the decoder), then
+    scored all at once with NumPy array math on sharpness, exposure and
+    scene change. Only the winning frame is decoded again at full size.
+    """
+
+    def __init__(self, sample_count=None, sample_width=None, sprite_columns=None):
+        self.sample_count = sample_count or settings.THUMBNAIL_SAMPLE_COUNT
+        self.sample_width = sample_width or settings.THUMBNAIL_SAMPLE_WIDTH
+        self.sprite_columns = sprite_columns or settings.THUMBNAIL_SPRITE_COLUMNS
+
+    def select(self, source_path, output_dir, info=None):
+        """Write the best thumbnail and the sprite sheet into output_dir"""
+        info = info or probe_media(source_path)
+        frames, timestamps = self.sample_frames(source_path, info)
+        scores = self.score_frames(frames)
+        best = int(np.argmax(scores))
+
+        thumbnail_path = os.path.join(output_dir, 'thumbnail.jpg')
+        self.extract_frame(source_path, timestamps[best], thumbnail_path)
+
+        sprite_path = os.path.join(output_dir, 'sprite.jpg')
+        self.build_sprite(frames).save(sprite_path, quality=80)
+
+        count, height, width, _ = frames.shape
+        return {
+            'thumbnail': thumbnail_path,
+            'timestamp': timestamps[best],
+            'score': round(float(scores[best]), 4),
+            'sprite': sprite_path,
+            'sprite_info': {
+                'columns': self.sprite_columns,
+                'rows': -(-count // self.sprite_columns),
+                'tile_width': width,
+                'tile_height': height,
+                'timestamps': [round(t, 3) for t in timestamps],
+            },
+        }
+
+    def sample_frames(self, source_path, info):
+        """Decode evenly spaced keyframes as an (N, height, width, 3) uint8 array
+
+        Returns the frames and the presentation time of each one.
+        """
+        if not info['width'] or not info['height']:
+            raise MediaProcessingError("Cannot sample frames without video dimensions")
+
+        width = self.sample_width
+        height = max(2, int(round(width * info['height'] / info['width'] / 2)) * 2)
+        interval = info['duration'] / self.sample_count if info['duration'] else 0
+
+        filters = [
+            f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})'",
+            f"scale={width}:{height}",
+            'showinfo',
+        ]
+        command = [
+            settings.FFMPEG_BINARY,
+            '-nostdin',
+            '-v', 'info',
+            '-skip_frame', 'nokey',
+            '-i', source_path,
+            '-map', '0:v:0',
+            '-vf', ','.join(filters),
+            '-vsync', 'vfr',
+            '-frames:v', str(self.sample_count),
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            'pipe:1',
+        ]
+        result = subprocess.run(command, capture_output=True, timeout=settings.TRANSCODE_TIMEOUT)
+        if result.returncode != 0:
+            # stderr is at info level here (for showinfo); the error is last
+            lines = result.stderr.decode(errors='replace').strip().splitlines()
+            raise MediaProcessingError(lines[-1] if lines else f"ffmpeg failed on {source_path}")
+
+        frames = np.frombuffer(result.stdout, dtype=np.uint8)
+        frames = frames[:frames.size - frames.size % (height * width * 3)]
+        frames = frames.reshape(-1, height, width, 3)
+        timestamps = [float(t) for t in PTS_TIME_PATTERN.findall(result.stderr.decode(errors='replace'))]
+
+        count = min(len(frames), len(timestamps))
+        if not count:
+            raise MediaProcessingError("No frames could be sampled from video")
+        return frames[:count], timestamps[:count]
+
+    def score_frames(self, frames):
+        """Score every frame at once; higher is a better thumbnail
+
+        - sharpness: variance of the Laplacian of the luma plane
+        - exposure: closeness of the mean luma to mid-grey
+        - scene change: mean absolute luma difference to the previous sample
+        Near-black and near-white frames (fades, title cards) score zero.
+        """
+        luma = frames.astype(np.float32) @ LUMA_WEIGHTS  # (N, H, W)
+
+        laplacian = (
+            luma[:, :-2, 1:-1] + luma[:, 2:, 1:-1]
+            + luma[:, 1:-1, :-2] + luma[:, 1:-1, 2:]
+            - 4 * luma[:, 1:-1, 1:-1]
+        )
+        sharpness = _normalize(laplacian.var(axis=(1, 2)))
+
+        brightness = luma.mean(axis=(1, 2)) / 255
+        exposure = 1 - np.abs(brightness - 0.5) * 2
+
+        scene_change = np.zeros(len(luma), dtype=np.float32)
+        if len(luma) > 1:
+            scene_change[1:] = np.abs(np.diff(luma, axis=0)).mean(axis=(1, 2))
+        scene_change = _normalize(scene_change)
+
+        scores = 0.5 * sharpness + 0.3 * exposure + 0.2 * scene_change
+        usable = (brightness >= MIN_BRIGHTNESS) & (brightness <= MAX_BRIGHTNESS)
+        # Fall back to the raw scores if every frame is too dark or too bright
+        return np.where(usable, scores, 0) if usable.any() else scores
+
+    def build_sprite(self, frames):
+        """Tile the sampled frames row by row into one image"""
+        count, height, width, channels = frames.shape
+        columns = self.sprite_columns
+        rows = -(-count // columns)
+
+        tiles = np.zeros((rows * columns, height, width, channels), dtype=np.uint8)
+        tiles[:count] = frames
+        grid = (
+            tiles.reshape(rows, columns, height, width, channels)
+            .transpose(0, 2, 1, 3, 4)
+            .reshape(rows * height, columns * width, channels)
+        )
+        return Image.fromarray(grid)
+
+    def extract_frame(self, source_path, timestamp, output_path):
+        """Decode a single full-size frame at timestamp (input seek, no full decode)"""
+        command = [
+            settings.FFMPEG_BINARY,
+            '-y', '-nostdin',
+            '-v', 'error',
+            '-ss', f"{timestamp:.3f}",
+            '-i', source_path,
+            '-map', '0:v:0',
+            '-frames:v', '1',
+            '-q:v', '2',
+            output_path,
+        ]
+        result = subprocess.run(command, capture_output=True, text=True, timeout=settings.TRANSCODE_TIMEOUT)
+        if result.returncode != 0 or not os.path.exists(output_path):
+            raise MediaProcessingError(result.stderr.strip() or f"Could not extract frame at {timestamp}s")
+        return output_path
+
+
+def _normalize(values):
+    """Scale an array to 0-1 by its maximum (all zeros stay zeros)"""
+    peak = values.max() if values.size else 0
+    return values / peak if peak > 0 else np.zeros_like(values)
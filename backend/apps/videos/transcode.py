@@ -0,0 +1,282 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from django.conf import settings
+from .media import MediaProcessingError, OutputSizeExceeded, check_output_size, probe_media, size_limit_args
+from .workspace import directory_size
+
+
+class TranscodeTimeout(MediaProcessingError):
+    """Raised when ffmpeg does not finish within the configured timeout"""
+
+
+class TranscodeEngine:
+    """Transcode videos with ffmpeg running as a streaming subprocess
+
+    Frames never go through Python: ffmpeg reads the source and writes the
+    output itself, and only its machine-readable progress report
+    (``-progress pipe:1``) is parsed here.
+    """
+
+    def __init__(self, preset=None, crf=None, threads=None, timeout=None):
+        self.preset = preset or settings.TRANSCODE_PRESET
+        self.crf = crf if crf is not None else settings.TRANSCODE_CRF
+        self.threads = threads if threads is not None else settings.TRANSCODE_THREADS
+        self.timeout = timeout or settings.TRANSCODE_TIMEOUT
+
+    def choose_mode(self, info, max_height=None):
+        """Decide how much work a source needs to become a compliant MP4
+
+        - remux: H.264 (yuv420p) video within the height and bitrate limits
+          and AAC or no audio; streams are copied into a faststart MP4
+        - audio: compliant video but other audio codec; only audio is encoded
+        - transcode: anything else goes through libx264/aac
+        """
+        max_height = max_height or settings.TRANSCODE_MAX_HEIGHT
+        video_bitrate = info['video_bitrate'] or info['bitrate']
+        video_ok = (
+            info['video_codec'] == 'h264'
+            and info['pixel_format'] in ('yuv420p', 'yuvj420p')
+            and 0 < info['height'] <= max_height
+            and 0 < video_bitrate <= settings.REMUX_MAX_BITRATE
+        )
+        if not video_ok:
+            return 'transcode'
+        if info['has_audio'] and info['audio_codec'] != 'aac':
+            return 'audio'
+        return 'remux'
+
+    def transcode(self, source_path, output_path, max_height=None, info=None, mode=None, on_progress=None,
+                  max_size=None):
+        """Turn source into an H.264/AAC faststart MP4, re-encoding only what is needed
+
+        on_progress is called with progress dicts; the returned stats include
+        the mode that was used (see choose_mode). ffmpeg stops at max_size
+        bytes and OutputSizeExceeded is raised.
+        """
+        max_height = max_height or settings.TRANSCODE_MAX_HEIGHT
+        info = info or probe_media(source_path)
+        mode = mode or self.choose_mode(info, max_height)
+
+        command = [
+            settings.FFMPEG_BINARY,
+            '-y', '-nostdin', '-nostats',
+            '-v', 'error',
+            '-i', source_path,
+            '-map', '0:v:0',
+            '-map', '0:a:0?',
+        ]
+        if mode == 'transcode':
+            command += [
+                '-vf', f"scale=-2:'min({max_height},ih)'",
+                '-c:v', 'libx264',
+                '-preset', self.preset,
+                '-crf', str(self.crf),
+                '-pix_fmt', 'yuv420p',
+                '-threads', str(self.threads),
+            ]
+        else:
+            command += ['-c:v', 'copy']
+
+        if mode == 'remux':
+            command += ['-c:a', 'copy']
+        else:
+            command += ['-c:a', 'aac', '-b:a', settings.TRANSCODE_AUDIO_BITRATE]
+
+        command += [
+            '-movflags', '+faststart',
+            '-progress', 'pipe:1',
+            *size_limit_args(max_size),
+            output_path,
+        ]
+        stats = self._run(command, info['duration'], on_progress)
+        check_output_size(output_path, max_size)
+        stats['mode'] = mode
+        return stats
+
+    def package_hls(self, source_path, output_dir, ladder=None, info=None, on_progress=None, max_size=None):
+        """Encode an adaptive-bitrate HLS ladder (fMP4/CMAF segments) in one ffmpeg pass
+
+        The source is decoded once and split into every rendition. Keyframes
+        are forced on segment boundaries so players can switch variants at
+        any segment. Returns the master playlist path and one dict per
+        rendition with its resolution, bitrate, playlist and segment paths.
+        Segments are separate files, which -fs does not cover: ffmpeg is
+        stopped once output_dir holds more than max_size bytes.
+        """
+        info = info or probe_media(source_path)
+        ladder = self._select_ladder(ladder or settings.HLS_LADDER, info['height'])
+        segment_duration = settings.HLS_SEGMENT_DURATION
+
+        renditions = []
+        for height, bitrate in ladder:
+            width = int(round(info['width'] * height / info['height'] / 2)) * 2 if info['height'] else 0
+            renditions.append({
+                'name': f"{height}p",
+                'width': width,
+                'height': height,
+                'bitrate': bitrate,
+            })
+
+        split = ''.join(f"[v{index}]" for index in range(len(renditions)))
+        filters = [f"[0:v:0]split={len(renditions)}{split}"]
+        filters += [
+            f"[v{index}]scale=-2:{rendition['height']}[v{index}out]"
+            for index, rendition in enumerate(renditions)
+        ]
+
+        command = [
+            settings.FFMPEG_BINARY,
+            '-y', '-nostdin', '-nostats',
+            '-v', 'error',
+            '-i', source_path,
+            '-filter_complex', ';'.join(filters),
+        ]
+        stream_map = []
+        for index, rendition in enumerate(renditions):
+            command += [
+                '-map', f"[v{index}out]",
+                f"-c:v:{index}", 'libx264',
+                f"-b:v:{index}", str(rendition['bitrate']),
+                f"-maxrate:v:{index}", str(int(rendition['bitrate'] * 1.07)),
+                f"-bufsize:v:{index}", str(int(rendition['bitrate'] * 1.5)),
+            ]
+            variant = f"v:{index}"
+            if info['has_audio']:
+                command += ['-map', '0:a:0', f"-c:a:{index}", 'aac', f"-b:a:{index}", '96k']
+                variant += f",a:{index}"
+            stream_map.append(f"{variant},name:{rendition['name']}")
+
+        command += [
+            '-preset', self.preset,
+            '-pix_fmt', 'yuv420p',
+            '-sc_threshold', '0',
+            '-force_key_frames', f"expr:gte(t,n_forced*{segment_duration})",
+            '-threads', str(self.threads),
+            '-f', 'hls',
+            '-hls_time', str(segment_duration),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%04d.m4s'),
+            '-master_pl_name', 'master.m3u8',
+            '-var_stream_map', ' '.join(stream_map),
+            '-progress', 'pipe:1',
+            os.path.join(output_dir, '%v', 'index.m3u8'),
+        ]
+
+        for rendition in renditions:
+            os.makedirs(os.path.join(output_dir, rendition['name']), exist_ok=True)
+
+        self._run(command, info['duration'], on_progress, output_dir=output_dir, max_size=max_size)
+
+        for rendition in renditions:
+            variant_dir = os.path.join(output_dir, rendition['name'])
+            rendition['playlist'] = os.path.join(variant_dir, 'index.m3u8')
+            rendition['segments'] = sorted(
+                os.path.join(variant_dir, name)
+                for name in os.listdir(variant_dir)
+                if name.endswith(('.m4s', '.mp4'))
+            )
+
+        return os.path.join(output_dir, 'master.m3u8'), renditions
+
+    def _select_ladder(self, ladder, source_height):
+        """Drop rungs taller than the source, always keeping the smallest one"""
+        ladder = sorted(ladder)
+        selected = [rung for rung in ladder if not source_height or rung[0] <= source_height]
+        return selected or ladder[:1]
+
+    def _run(self, command, duration, on_progress, output_dir=None, max_size=None):
+        """Run an ffmpeg command, streaming its progress and enforcing the timeout
+
+        With output_dir and max_size, ffmpeg is also stopped when the
+        directory grows past max_size bytes (checked at each progress report).
+        """
+        started = time.monotonic()
+        timed_out = threading.Event()
+        oversized = False
+
+        # stderr goes to a file so a chatty ffmpeg can never block on a full pipe
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                text=True,
+            )
+
+            def kill():
+                timed_out.set()
+                process.kill()
+
+            watchdog = threading.Timer(self.timeout, kill)
+            watchdog.start()
+            progress = {}
+            try:
+                report = {}
+                for line in process.stdout:
+                    key, _, value = line.strip().partition('=')
+                    report[key] = value
+                    if key == 'progress':
+                        progress = self._parse_progress(report, duration)
+                        if on_progress:
+                            on_progress(progress)
+                        report = {}
+                        if max_size and output_dir and directory_size(output_dir) > max_size:
+                            oversized = True
+                            process.kill()
+                            break
+                process.wait()
+            finally:
+                watchdog.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+
+            if timed_out.is_set():
+                raise TranscodeTimeout(f"ffmpeg exceeded the {self.timeout}s timeout")
+            if oversized:
+                raise OutputSizeExceeded(f"ffmpeg output exceeded the {max_size} bytes limit")
+
+            if process.returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode(errors='replace').strip()
+                raise MediaProcessingError(message or f"ffmpeg exited with code {process.returncode}")
+
+        progress.update({
+            'percent': 100.0,
+            'elapsed': round(time.monotonic() - started, 2),
+        })
+        return progress
+
+    def _parse_progress(self, report, duration):
+        """Turn one ffmpeg -progress block into a JSON-serializable dict"""
+        # out_time_us is reported in microseconds (out_time_ms is misnamed
+        # and also in microseconds in most ffmpeg builds)
+        out_time_us = report.get('out_time_us') or report.get('out_time_ms') or '0'
+        try:
+            position = max(int(out_time_us), 0) / 1_000_000
+        except ValueError:
+            position = 0.0
+
+        percent = min(position / duration * 100, 100.0) if duration else 0.0
+
+        return {
+            'position': round(position, 2),
+            'duration': round(duration or 0, 2),
+            'percent': round(percent, 1),
+            'fps': _to_float(report.get('fps')),
+            'speed': _to_float(report.get('speed', '').rstrip('x')),
+            'done': report.get('progress') == 'end',
+        }
+
+
+def _to_float(value):
+    """Parse a numeric ffmpeg progress value ('N/A' and blanks become None)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
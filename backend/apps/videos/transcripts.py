@@ -0,0 +1,167 @@
+import bisect
+import struct
+import redis
+from django.conf import settings
+from .models import VideoTranscript
+from .redis_client import get_redis
+
+CAPTION_FORMATS = {
+    'srt': 'application/x-subrip; charset=utf-8',
+    'vtt': 'text/vtt; charset=utf-8',
+}
+
+# Start/end pairs are stored as little-endian uint32 milliseconds
+_TIME_PAIR = struct.Struct('<II')
+
+
+def pack_times(items):
+    """Start/end of every item (seconds) as interleaved millisecond bytes"""
+    times = [max(round(value * 1000), 0) for item in items for value in (item['start'], item['end'])]
+    return struct.pack(f'<{len(times)}I', *times)
+
+
+def unpack_times(data):
+    """(start, end) pairs in seconds of pack_times() bytes"""
+    return [(start / 1000, end / 1000) for start, end in _TIME_PAIR.iter_unpack(bytes(data or b''))]
+
+
+def pack_transcript(transcript):
+    """Columns of a transcript ({'text', 'segments', 'words'})
+
+    Texts are joined with newlines and timestamps packed into arrays, so a
+    transcript takes a few bytes per word instead of a JSON object each.
+    """
+    segments = transcript.get('segments') or []
+    words = transcript.get('words') or []
+    return {
+        'segment_text': '\n'.join(_line(segment['text']) for segment in segments),
+        'segment_times': pack_times(segments),
+        'word_text': '\n'.join(_line(word['word']) for word in words),
+        'word_times': pack_times(words),
+    }
+
+
+def unpack_items(text, times, key):
+    """Items ({key, 'start', 'end'}) of one text column and its times"""
+    texts = text.split('\n') if text else []
+    return [
+        {key: value, 'start': start, 'end': end}
+        for value, (start, end) in zip(texts, unpack_times(times))
+    ]
+
+
+def save_transcript(video, transcript, provider):
+    """Store a transcript as the video's text and timestamped transcript"""
+    video.transcription = transcript['text']
+    # Pipeline stages hold stale instances: never write the other fields
+    video.save(update_fields=['transcription'])
+    VideoTranscript.objects.update_or_create(
+        video=video,
+        defaults={'provider': provider, **pack_transcript(transcript)}
+    )
+
+
+def build_cues(segments, words, max_chars=None, max_duration=None):
+    """Caption cues ({'start', 'end', 'text'}) of a transcript
+
+    With word timestamps, every segment is cut into cues of at most
+    max_chars characters and max_duration seconds; without them each
+    segment is one cue.
+    """
+    max_chars = max_chars or settings.CAPTION_MAX_CHARS
+    max_duration = max_duration or settings.CAPTION_MAX_DURATION
+    if not words:
+        return [dict(segment) for segment in segments if segment['text']]
+
+    # Each word goes to the segment it starts in
+    boundaries = [segment['start'] for segment in segments[1:]]
+    groups = [[] for _ in segments] or [[]]
+    for word in words:
+        groups[bisect.bisect_right(boundaries, word['start'])].append(word)
+
+    cues = []
+    for group in groups:
+        cue = []
+        length = 0
+        for word in group:
+            if cue and (length + 1 + len(word['word']) > max_chars or word['end'] - cue[0]['start'] > max_duration):
+                cues.append(_cue(cue))
+                cue = []
+            length = len(word['word']) + (length + 1 if cue else 0)
+            cue.append(word)
+        if cue:
+            cues.append(_cue(cue))
+    return cues
+
+
+def render_captions(cues, caption_format):
+    """SRT or WebVTT document of cues"""
+    separator = ',' if caption_format == 'srt' else '.'
+    blocks = []
+    for index, cue in enumerate(cues, start=1):
+        timing = f"{_timestamp(cue['start'], separator)} --> {_timestamp(cue['end'], separator)}"
+        text = _wrap(cue['text'], settings.CAPTION_LINE_LENGTH)
+        blocks.append(f"{index}\n{timing}\n{text}\n" if caption_format == 'srt' else f"{timing}\n{text}\n")
+    body = '\n'.join(blocks)
+    return body if caption_format == 'srt' else f"WEBVTT\n\n{body}"
+
+
+def captions_version(transcript):
+    """Version of the captions of a transcript (changes when it is saved again)"""
+    return f"{transcript.video_id}-{int(transcript.updated_at.timestamp() * 1000)}"
+
+
+def get_captions(transcript, caption_format):
+    """SRT/WebVTT captions of a transcript, rendered once per version
+
+    Rendered documents are kept in Redis for CAPTION_CACHE_TTL seconds;
+    without Redis they are rendered on every request.
+    """
+    key = f"captions:{captions_version(transcript)}:{caption_format}"
+    try:
+        cached = get_redis().get(key)
+    except redis.RedisError:
+        cached = None
+    if cached is not None:
+        return cached
+
+    cues = build_cues(
+        unpack_items(transcript.segment_text, transcript.segment_times, 'text'),
+        unpack_items(transcript.word_text, transcript.word_times, 'word')
+    )
+    document = render_captions(cues, caption_format)
+    try:
+        get_redis().set(key, document, ex=settings.CAPTION_CACHE_TTL)
+    except redis.RedisError:
+        pass
+    return document
+
+
+def _line(text):
+    return ' '.join(str(text).split())
+
+
+def _cue(words):
+    return {
+        'start': words[0]['start'],
+        'end': words[-1]['end'],
+        'text': ' '.join(word['word'] for word in words),
+    }
+
+
+def _timestamp(seconds, separator):
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def _wrap(text, line_length):
+    """Break a cue longer than line_length into two lines at the middle space"""
+    if len(text) <= line_length or ' ' not in text:
+        return text
+    middle = len(text) // 2
+    spaces = [index for index, char in enumerate(text) if char == ' ']
+    split = min(spaces, key=lambda index: abs(index - middle))
+    return f"{text[:split]}\n{text[split + 1:]}"
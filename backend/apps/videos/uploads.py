@@ -0,0 +1,187 @@
+import base64
+import fcntl
+import hashlib
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from .models import UploadSession, Video
+
+TUS_VERSION = '1.0.0'
+CHUNK_READ_SIZE = 1024 * 1024  # 1MB
+
+# Running SHA-256 per session, so each chunk is hashed once as it streams
+# through. Hash objects cannot be persisted, so a process that did not see
+# the previous chunks rebuilds the state from the bytes already on disk.
+# Entries of sessions idle for UPLOAD_HASHER_IDLE_TIMEOUT are dropped.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """Raised when an upload request violates the protocol"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_metadata(header):
+    """Parse a tus Upload-Metadata header ("key base64value,key2 base64value2")"""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in (header or '').split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ''
+        except (ValueError, UnicodeDecodeError):
+            raise UploadError(f"Invalid Upload-Metadata value for {key}")
+    return metadata
+
+
+def create_session(user, upload_length, metadata):
+    """Validate an announced upload and reserve its final storage location"""
+    if upload_length <= 0:
+        raise UploadError("Upload-Length must be a positive integer")
+    if upload_length > settings.MAX_VIDEO_SIZE:
+        raise UploadError("File size cannot exceed 100MB", status_code=413)
+
+    filename = metadata.get('filename', '')
+    file_extension = filename.split('.')[-1].lower()
+    if file_extension not in settings.SUPPORTED_VIDEO_FORMATS:
+        raise UploadError(
+            f"File format not supported. Allowed formats: {', '.join(settings.SUPPORTED_VIDEO_FORMATS)}"
+        )
+
+    session_id = uuid.uuid4()
+    name = default_storage.get_available_name(f"videos/{session_id}.{file_extension}")
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+    video = Video.objects.create(
+        user=user,
+        title=(metadata.get('title') or filename)[:200],
+        description=metadata.get('description', ''),
+        is_public=metadata.get('is_public', 'true').lower() != 'false',
+        video_file=name,
+        status='uploading'
+    )
+    return UploadSession.objects.create(
+        id=session_id,
+        user=user,
+        video=video,
+        filename=filename,
+        upload_length=upload_length
+    )
+
+
+def append_chunk(session, offset, stream):
+    """Write the request body to the upload file at offset; return the new offset
+
+    Bytes are written to the final file as they arrive. If the client
+    disconnects mid-chunk, everything received so far is kept so it can
+    resume from the returned offset. The file is locked while writing, so
+    a concurrent PATCH of the same upload is rejected instead of writing
+    over (or truncating) this one.
+    """
+    with open(session.video.video_file.path, 'r+b') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Upload is being written by another request", status_code=409)
+
+        # Another request may have advanced it before we got the lock
+        session.refresh_from_db(fields=['offset', 'completed_at'])
+        if session.completed_at:
+            raise UploadError("Upload already completed", status_code=403)
+        if offset != session.offset:
+            raise UploadError("Upload-Offset does not match current offset", status_code=409)
+
+        hasher = _get_hasher(session)
+        remaining = session.upload_length - offset
+        written = 0
+
+        f.seek(offset)
+        try:
+            while written < remaining:
+                data = stream.read(min(CHUNK_READ_SIZE, remaining - written))
+                if not data:
+                    break
+                f.write(data)
+                hasher.update(data)
+                written += len(data)
+        finally:
+            f.truncate(offset + written)
+            new_offset = offset + written
+            # Compare-and-set so two concurrent PATCHes cannot both advance
+            updated = UploadSession.objects.filter(id=session.id, offset=offset).update(
+                offset=new_offset,
+                updated_at=timezone.now()
+            )
+            with _hashers_lock:
+                if updated:
+                    _hashers[session.id] = (new_offset, hasher, time.monotonic())
+                else:
+                    _hashers.pop(session.id, None)
+
+        if not updated:
+            raise UploadError("Upload was modified concurrently", status_code=409)
+
+        session.offset = new_offset
+        if session.offset == session.upload_length:
+            _complete(session, hasher)
+    return session.offset
+
+
+def abort_session(session):
+    """Delete an unfinished upload, its file and its video"""
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    # Deleting the video also removes the session
+    session.video.video_file.delete(save=False)
+    session.video.delete()
+
+
+def _get_hasher(session):
+    """Return the running hash for the bytes already received"""
+    with _hashers_lock:
+        _evict_idle_hashers()
+        hashed_offset, hasher, _ = _hashers.pop(session.id, (None, None, None))
+    if hasher is not None and hashed_offset == session.offset:
+        return hasher
+
+    hasher = hashlib.sha256()
+    with open(session.video.video_file.path, 'rb') as f:
+        remaining = session.offset
+        while remaining > 0:
+            data = f.read(min(CHUNK_READ_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def _evict_idle_hashers():
+    """Drop the hashes of uploads abandoned by their clients (lock held)"""
+    deadline = time.monotonic() - settings.UPLOAD_HASHER_IDLE_TIMEOUT
+    for session_id in [key for key, (_, _, used_at) in _hashers.items() if used_at < deadline]:
+        del _hashers[session_id]
+
+
+def _complete(session, hasher):
+    """Record the content hash and final size of a finished upload"""
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+
+    session.sha256 = hasher.hexdigest()
+    session.completed_at = timezone.now()
+    session.save(update_fields=['sha256', 'completed_at'])
+
+    video = session.video
+    video.file_size = session.upload_length
+    video.content_hash = session.sha256
+    video.save(update_fields=['file_size', 'content_hash', 'updated_at'])
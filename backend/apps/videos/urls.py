@@ -5,7 +5,14 @@ urlpatterns = [
     path('', views.VideoListCreateView.as_view(), name='video-list-create'),
     path('<int:pk>/', views.VideoDetailView.as_view(), name='video-detail'),
     path('<int:pk>/upload/', views.VideoUploadView.as_view(), name='video-upload'),
+    path('uploads/', views.ChunkedUploadCreateView.as_view(), name='chunked-upload-create'),
+    path('uploads/<uuid:pk>/', views.ChunkedUploadView.as_view(), name='chunked-upload'),
     path('youtube/download/', views.YouTubeDownloadView.as_view(), name='youtube-download'),
     path('tags/', views.TagListView.as_view(), name='tag-list'),
+    path('<int:pk>/captions.<str:caption_format>', views.VideoCaptionsView.as_view(), name='video-captions'),
     path('<int:pk>/processing-status/', views.VideoProcessingStatusView.as_view(), name='video-processing-status'),
+    path('<int:pk>/retry/', views.retry_processing, name='video-retry-processing'),
+    path('<int:pk>/cancel/', views.cancel_processing, name='video-cancel-processing'),
+    path('processing-status/', views.VideoProcessingStatusBatchView.as_view(), name='video-processing-status-batch'),
+    path('processing-events/', views.VideoProcessingEventsView.as_view(), name='video-processing-events'),
 ]
@@ -1,14 +1,27 @@
+import io
+import json
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Video, VideoProcessingTask, YouTubeDownload, Tag
+from .models import Video, VideoProcessingTask, VideoTranscript, YouTubeDownload, Tag, UploadSession
 from .serializers import (
     VideoSerializer, VideoUploadSerializer, YouTubeDownloadSerializer,
     TagSerializer, VideoProcessingTaskSerializer
 )
-from .tasks import download_youtube_video, process_video
+from .fairshare import submit_processing
+from .pipeline import active_tasks, stages_to_run
+from .progress import FINAL_STATUSES, astream_progress, stream_progress
+from .transcripts import CAPTION_FORMATS, captions_version, get_captions
+from .tasks import download_youtube_video
+from . import uploads
 
 
 class VideoListCreateView(generics.ListCreateAPIView):
@@ -16,12 +29,16 @@ class VideoListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Video.objects.filter(user=self.request.user)
+        return (
+            Video.objects.filter(user=self.request.user)
+            .select_related('metadata', 'analysis')
+            .prefetch_related('tags', 'renditions')
+        )
 
     def perform_create(self, serializer):
         video = serializer.save(user=self.request.user)
         # Start processing the video
-        process_video.delay(video.id)
+        submit_processing(video)
 
 
 class VideoDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -29,7 +46,11 @@ class VideoDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Video.objects.filter(user=self.request.user)
+        return (
+            Video.objects.filter(user=self.request.user)
+            .select_related('metadata', 'analysis')
+            .prefetch_related('tags', 'renditions')
+        )
 
 
 class VideoUploadView(generics.CreateAPIView):
@@ -39,7 +60,107 @@ class VideoUploadView(generics.CreateAPIView):
     def perform_create(self, serializer):
         video = serializer.save(user=self.request.user)
         # Start processing the uploaded video
-        process_video.delay(video.id)
+        submit_processing(video)
+
+
+class ChunkedUploadCreateView(APIView):
+    """Start a resumable upload (tus creation extension)
+
+    The client announces the total size in Upload-Length and the video
+    fields (filename, title, description, is_public) in Upload-Metadata.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            upload_length = int(request.headers.get('Upload-Length', ''))
+        except ValueError:
+            return _tus_error("Upload-Length header is required", status.HTTP_400_BAD_REQUEST)
+
+        try:
+            metadata = uploads.parse_metadata(request.headers.get('Upload-Metadata'))
+            session = uploads.create_session(request.user, upload_length, metadata)
+        except uploads.UploadError as e:
+            return _tus_error(str(e), e.status_code)
+
+        return Response(
+            {'id': session.id, 'video_id': session.video_id},
+            status=status.HTTP_201_CREATED,
+            headers={
+                'Location': request.build_absolute_uri(f"{session.id}/"),
+                'Upload-Offset': '0',
+                'Tus-Resumable': uploads.TUS_VERSION,
+            }
+        )
+
+
+class ChunkedUploadView(APIView):
+    """Query (HEAD), append to (PATCH) or abort (DELETE) a resumable upload
+
+    PATCH bodies are streamed straight to the final file instead of being
+    parsed, so request.data must never be touched here.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_session(self):
+        return get_object_or_404(
+            UploadSession.objects.select_related('video'),
+            id=self.kwargs['pk'],
+            user=self.request.user
+        )
+
+    def head(self, request, pk):
+        session = self.get_session()
+        return Response(headers={
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.upload_length),
+            'Tus-Resumable': uploads.TUS_VERSION,
+            'Cache-Control': 'no-store',
+        })
+
+    def patch(self, request, pk):
+        if request.content_type != 'application/offset+octet-stream':
+            return _tus_error(
+                "Content-Type must be application/offset+octet-stream",
+                status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return _tus_error("Upload-Offset header is required", status.HTTP_400_BAD_REQUEST)
+
+        session = self.get_session()
+        try:
+            new_offset = uploads.append_chunk(session, offset, request.stream or io.BytesIO())
+        except uploads.UploadError as e:
+            return _tus_error(str(e), e.status_code)
+
+        # Only the final chunk starts the processing pipeline
+        if session.completed_at:
+            submit_processing(session.video)
+
+        return Response(status=status.HTTP_204_NO_CONTENT, headers={
+            'Upload-Offset': str(new_offset),
+            'Tus-Resumable': uploads.TUS_VERSION,
+        })
+
+    def delete(self, request, pk):
+        session = self.get_session()
+        if session.completed_at:
+            return _tus_error("Upload already completed", status.HTTP_403_FORBIDDEN)
+
+        uploads.abort_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT, headers={
+            'Tus-Resumable': uploads.TUS_VERSION,
+        })
+
+
+def _tus_error(message, status_code):
+    return Response(
+        {'error': message},
+        status=status_code,
+        headers={'Tus-Resumable': uploads.TUS_VERSION}
+    )
 
 
 class YouTubeDownloadView(generics.CreateAPIView):
@@ -58,6 +179,33 @@ class TagListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
 
+class VideoCaptionsView(APIView):
+    """Captions of a video as SRT or WebVTT, rendered from its word timestamps
+
+    Responses carry an ETag of the transcript version, so players only
+    download the captions again after a new transcription.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, caption_format):
+        if caption_format not in CAPTION_FORMATS:
+            return Response(
+                {'error': f"Unsupported caption format: {caption_format}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        transcript = get_object_or_404(VideoTranscript, video_id=pk, video__user=request.user)
+
+        etag = f'"{captions_version(transcript)}-{caption_format}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(get_captions(transcript, caption_format), content_type=CAPTION_FORMATS[caption_format])
+            response['Content-Disposition'] = f'inline; filename="video-{pk}.{caption_format}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 class VideoProcessingStatusView(generics.RetrieveAPIView):
     serializer_class = VideoProcessingTaskSerializer
     permission_classes = [IsAuthenticated]
@@ -74,10 +222,15 @@ class VideoProcessingStatusView(generics.RetrieveAPIView):
         
         serializer = VideoProcessingTaskSerializer(tasks, many=True)
         
-        # Calculate overall progress
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(status='completed').count()
-        failed_tasks = tasks.filter(status='failed').count()
+        # Calculate overall progress (one aggregate query)
+        counts = tasks.aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            failed=Count('id', filter=Q(status='failed'))
+        )
+        total_tasks = counts['total']
+        completed_tasks = counts['completed']
+        failed_tasks = counts['failed']
         
         progress = 0
         if total_tasks > 0:
@@ -94,27 +247,141 @@ class VideoProcessingStatusView(generics.RetrieveAPIView):
         })
 
 
+class VideoProcessingStatusBatchView(APIView):
+    """Processing status of many videos in one aggregate query
+
+    GET ?ids=1,2,3 (defaults to the user's videos still in progress)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            video_ids = _requested_video_ids(request)
+        except ValueError:
+            return Response(
+                {'error': 'ids must be a comma-separated list of video ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'videos': _processing_summaries(request.user, video_ids)})
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients ask for text/event-stream; errors are still sent as JSON"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class VideoProcessingEventsView(APIView):
+    """Server-Sent Events stream of processing progress, replacing polling
+
+    GET ?ids=1,2,3 (defaults to the user's videos still in progress). Sends a
+    'status' event per video first, then 'task' events (stage status and
+    ffmpeg percent) and 'video' events (overall status) as they happen.
+    Responds 204, which stops EventSource from reconnecting, once no video
+    is left in progress.
+
+    Meant to be served by the ASGI events service (config/asgi.py), where
+    open streams wait on the event loop; under WSGI each one holds a thread.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        try:
+            video_ids = _requested_video_ids(request)
+        except ValueError:
+            return Response(
+                {'error': 'ids must be a comma-separated list of video ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        summaries = _processing_summaries(request.user, video_ids)
+        if all(summary['status'] in FINAL_STATUSES for summary in summaries):
+            return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+        stream = astream_progress if isinstance(request._request, ASGIRequest) else stream_progress
+        response = StreamingHttpResponse(
+            stream(
+                [summary['video_id'] for summary in summaries],
+                snapshot=[('status', summary) for summary in summaries]
+            ),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def _requested_video_ids(request):
+    """Video ids of the ids query parameter, None when it is absent"""
+    ids = request.query_params.get('ids')
+    if not ids:
+        return None
+    return [int(video_id) for video_id in ids.split(',') if video_id.strip()][:settings.PROGRESS_BATCH_MAX]
+
+
+def _processing_summaries(user, video_ids=None):
+    """Status and task counts of a user's videos, in a single query"""
+    videos = Video.objects.filter(user=user)
+    if video_ids is None:
+        videos = videos.filter(status__in=['uploading', 'processing'])
+    else:
+        videos = videos.filter(id__in=video_ids)
+
+    rows = (
+        videos.annotate(
+            total_tasks=Count('processing_tasks'),
+            completed_tasks=Count('processing_tasks', filter=Q(processing_tasks__status='completed')),
+            failed_tasks=Count('processing_tasks', filter=Q(processing_tasks__status='failed'))
+        )
+        .order_by('-created_at')
+        .values('id', 'status', 'total_tasks', 'completed_tasks', 'failed_tasks')[:settings.PROGRESS_BATCH_MAX]
+    )
+    return [
+        {
+            'video_id': row['id'],
+            'status': row['status'],
+            'progress': (row['completed_tasks'] / row['total_tasks']) * 100 if row['total_tasks'] else 0,
+            'total_tasks': row['total_tasks'],
+            'completed_tasks': row['completed_tasks'],
+            'failed_tasks': row['failed_tasks'],
+        }
+        for row in rows
+    ]
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def retry_processing(request, pk):
-    """Retry processing a failed video"""
+    """Retry the failed stages of a video"""
     video = get_object_or_404(Video, id=pk, user=request.user)
     
-    if video.status != 'failed':
+    # A ready video can still have failed optional stages (thumbnail,
+    # transcription, ...); those are retried without the completed ones
+    if video.status != 'failed' and not stages_to_run(video):
         return Response(
-            {'error': 'Video is not in failed state'}, 
+            {'error': 'Video has no failed processing stages'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    # A required stage failed but others are still running
+    if active_tasks(video).exists():
+        return Response(
+            {'error': 'Video is still being processed'}, 
+            status=status.HTTP_409_CONFLICT
+        )
+    
     # Reset status and retry processing
     video.status = 'processing'
-    video.save()
-    
-    # Clear failed tasks
-    video.processing_tasks.filter(status='failed').delete()
+    video.save(update_fields=['status'])
     
-    # Start processing again
-    process_video.delay(video.id)
+    # Completed stages are cached: only failed stages and the stages
+    # downstream of them run again (see pipeline.stages_to_run)
+    submit_processing(video)
     
     return Response({'message': 'Video processing restarted'})
 
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import time
+from django.conf import settings
+
+SCRATCH_DIR_NAME = 'shorts-scratch'
+
+
+class ScratchQuotaExceeded(Exception):
+    """Raised when a job writes more than its scratch quota"""
+
+
+class ScratchSpace:
+    """Private scratch directory for one job, removed when the job ends
+
+    Every job gets a fresh directory from mkdtemp, so concurrent jobs on the
+    same host never share file names. Point SCRATCH_ROOT at a tmpfs mount
+    (e.g. /dev/shm) to keep intermediates off disk.
+
+        with ScratchSpace('compress') as scratch:
+            output_path = scratch.file('compressed.mp4')
+            ...
+            scratch.check_quota()
+    """
+
+    def __init__(self, prefix='job', quota=None, root=None):
+        self.prefix = prefix
+        self.quota = quota if quota is not None else settings.SCRATCH_QUOTA
+        self.root = os.path.join(root or settings.SCRATCH_ROOT, SCRATCH_DIR_NAME)
+        self.path = None
+
+    def __enter__(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=f"{self.prefix}-", dir=self.root)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        shutil.rmtree(self.path, ignore_errors=True)
+        return False
+
+    def file(self, name):
+        """Path for a file inside this scratch directory"""
+        return os.path.join(self.path, name)
+
+    def usage(self):
+        """Bytes currently used by this scratch directory"""
+        return directory_size(self.path)
+
+    def check_quota(self):
+        """Raise ScratchQuotaExceeded if the job wrote more than its quota"""
+        if self.quota and self.usage() > self.quota:
+            raise ScratchQuotaExceeded(
+                f"Scratch space for {self.prefix} exceeded {self.quota} bytes"
+            )
+
+
+def directory_size(path):
+    """Bytes of the files under path"""
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+def purge_stale_scratch(max_age=None, root=None, work_root=None):
+    """Remove scratch directories left behind by killed workers
+
+    Pipeline artifact directories (MEDIA_WORK_ROOT, see
+    pipeline._prepare_inputs) are purged too: a stage killed before it
+    discarded its artifact link leaves the directory behind.
+    """
+    max_age = max_age if max_age is not None else settings.SCRATCH_MAX_AGE
+    cutoff = time.time() - max_age
+    _remove_older_dirs(os.path.join(root or settings.SCRATCH_ROOT, SCRATCH_DIR_NAME), cutoff)
+    _remove_older_dirs(work_root or settings.MEDIA_WORK_ROOT, cutoff)
+
+
+def _remove_older_dirs(parent, cutoff):
+    """Remove the directories in parent last modified before cutoff"""
+    if not os.path.isdir(parent):
+        return
+
+    for entry in os.scandir(parent):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
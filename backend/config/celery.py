@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_ready
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -18,3 +19,52 @@ app.autodiscover_tasks()
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_ready.connect
+def purge_stale_scratch_dirs(**kwargs):
+    """Remove scratch directories left behind by workers that were killed"""
+    from apps.videos.workspace import purge_stale_scratch
+    purge_stale_scratch()
+
+
+@worker_process_init.connect
+def init_ai_clients(**kwargs):
+    """Open the AI provider clients once per worker process, after the fork
+
+    Connection pools must not be shared across a fork, so clients inherited
+    from the parent are dropped first.
+    """
+    from apps.ai_processing.clients import init_clients, reset_clients
+    reset_clients()
+    init_clients()
+
+
+def consumes_transcription_queue():
+    """Whether this worker consumes the queue transcription tasks are routed to
+
+    Only those workers load the local transcription model; the others
+    (transcode, download, ...) would hold it in memory for nothing.
+    """
+    return settings.LOCAL_TRANSCRIPTION['queue'] in app.amqp.queues.consume_from
+
+
+@worker_process_init.connect
+def load_local_transcription_engine(**kwargs):
+    """Load the local transcription model once per worker process, after the fork"""
+    from apps.ai_processing.local_engine import get_local_engine, reset_local_engine
+    reset_local_engine()
+    if consumes_transcription_queue():
+        get_local_engine()
+
+
+@worker_ready.connect
+def warm_local_transcription_engine(sender, **kwargs):
+    """Load the local transcription model in thread/solo pool workers
+
+    Those pools start no child processes, so worker_process_init never fires.
+    """
+    from celery.concurrency.prefork import TaskPool
+    if not isinstance(sender.pool, TaskPool) and consumes_transcription_queue():
+        from apps.ai_processing.local_engine import get_local_engine
+        get_local_engine()
@@ -191,10 +191,105 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Task queues, each consumed by its own worker pool (see docker-compose.yml):
+# - default: short orchestration and thumbnail tasks (prefork)
+# - transcode: long CPU-bound ffmpeg encodes (prefork, one process per core)
+# - download: network IO, yt-dlp downloads (threads)
+# - ai: external AI API calls (threads)
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'apps.videos.tasks.compress_video': {'queue': 'transcode'},
+    'apps.videos.tasks.package_hls': {'queue': 'transcode'},
+    'apps.videos.tasks.download_youtube_video': {'queue': 'download'},
+    'apps.videos.tasks.extract_transcription': {'queue': 'ai'},
+    'apps.videos.tasks.analyze_content': {'queue': 'ai'},
+    'apps.ai_processing.tasks.*': {'queue': 'ai'},
+}
+# Acknowledge after the task ran, so a killed worker's task is redelivered.
+# On-demand AI tasks ack early instead: a redelivery would pay for the API
+# call twice. Pipeline stages keep acks_late even when they call an AI API:
+# a lost chord member would leave finalize_pipeline waiting forever.
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_TASK_ANNOTATIONS = {
+    'apps.ai_processing.tasks.transcribe_video_task': {'acks_late': False},
+    'apps.ai_processing.tasks.analyze_content_task': {'acks_late': False},
+    'apps.ai_processing.tasks.batch_transcribe_task': {'acks_late': False},
+}
+# Prefetch is set per worker pool on the command line; this is the fallback
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Unacknowledged tasks are redelivered after this long, so it must be
+# longer than the slowest acks-late task (TRANSCODE_TIMEOUT)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': config('CELERY_VISIBILITY_TIMEOUT', default=2 * 60 * 60, cast=int),
+}
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-fair-share': {
+        'task': 'apps.videos.tasks.dispatch_fair_share',
+        'schedule': 30.0,
+    },
+}
+
+# Redis (fair-share scheduler state)
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+
+# Processing progress push (Server-Sent Events over Redis pub/sub)
+PROGRESS_STREAM_HEARTBEAT = config('PROGRESS_STREAM_HEARTBEAT', default=15, cast=int)  # seconds
+# Streams are closed after this long and the browser reconnects, so a
+# forgotten tab does not hold a connection forever
+PROGRESS_STREAM_MAX_DURATION = config('PROGRESS_STREAM_MAX_DURATION', default=5 * 60, cast=int)  # seconds
+PROGRESS_STREAM_RETRY_MS = 3000  # EventSource reconnect delay
+PROGRESS_BATCH_MAX = 100  # videos per status request/stream
+
+# Fair-share scheduling of processing jobs (apps/videos/fairshare.py)
+FAIRSHARE_MAX_PER_USER = config('FAIRSHARE_MAX_PER_USER', default=2, cast=int)  # jobs running per user
+FAIRSHARE_MAX_IN_FLIGHT = config('FAIRSHARE_MAX_IN_FLIGHT', default=16, cast=int)  # jobs running in total
+# A job's slot is freed after this long even if it never reported back
+FAIRSHARE_LEASE_TIMEOUT = config('FAIRSHARE_LEASE_TIMEOUT', default=2 * 60 * 60, cast=int)  # seconds
+
 # AI Service Configuration
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 GROQ_API_KEY = config('GROQ_API_KEY', default='')
+TRANSCRIPTION_PROVIDER = config('TRANSCRIPTION_PROVIDER', default='openai')
+CONTENT_ANALYSIS_PROVIDER = config('CONTENT_ANALYSIS_PROVIDER', default='openai')
+# Per-provider HTTP clients, created once per worker process
+# (apps/ai_processing/clients.py). timeout in seconds; pool_size is the
+# number of kept-alive connections.
+AI_PROVIDER_CLIENTS = {
+    provider: {
+        'timeout': config(f'{provider.upper()}_TIMEOUT', default=120, cast=float),
+        'max_retries': config(f'{provider.upper()}_MAX_RETRIES', default=2, cast=int),
+        'pool_size': config(f'{provider.upper()}_POOL_SIZE', default=10, cast=int),
+        'keepalive_expiry': config(f'{provider.upper()}_KEEPALIVE_EXPIRY', default=60, cast=float),
+        # Point at `manage.py fake_ai_provider` to run without the real APIs
+        'base_url': config(f'{provider.upper()}_BASE_URL', default='') or None,
+    }
+    for provider in ('openai', 'groq', 'gemini')
+}
+# Provider routing (apps/ai_processing/routing.py): rolling window of
+# requests per provider, circuit breaker thresholds, request hedging
+AI_ROUTER = {
+    'window': config('AI_ROUTER_WINDOW', default=50, cast=int),  # requests
+    'failure_threshold': config('AI_ROUTER_FAILURE_THRESHOLD', default=5, cast=int),  # consecutive failures
+    'error_rate_threshold': config('AI_ROUTER_ERROR_RATE', default=0.5, cast=float),
+    'cooldown': config('AI_ROUTER_COOLDOWN', default=30, cast=float),  # seconds before a trial request
+    'hedging': config('AI_ROUTER_HEDGING', default=True, cast=bool),
+    'hedge_quantile': 0.95,  # hedge once the first provider is slower than this latency quantile
+    'hedge_min_samples': 20,  # no hedging before the quantile is meaningful
+    'max_threads': config('AI_ROUTER_MAX_THREADS', default=16, cast=int),
+}
+# Batch transcription (apps/ai_processing/async_services.py): videos per
+# batch job, and provider requests in flight at once in its event loop
+AI_BATCH_SIZE = config('AI_BATCH_SIZE', default=20, cast=int)
+AI_BATCH_CONCURRENCY = config('AI_BATCH_CONCURRENCY', default=8, cast=int)
+# Content analysis of transcripts longer than ANALYSIS_CHUNK_TOKENS is done
+# per chunk (concurrently, chunk results cached) and merged
+ANALYSIS_CHUNK_TOKENS = config('ANALYSIS_CHUNK_TOKENS', default=3000, cast=int)
+ANALYSIS_MAX_WORKERS = config('ANALYSIS_MAX_WORKERS', default=4, cast=int)  # requests at once
+ANALYSIS_CACHE_MAX_BYTES = config('ANALYSIS_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+ANALYSIS_MAX_TAGS = 10
+ANALYSIS_MAX_TOPICS = 5
 
 # Social Media API Configuration
 YOUTUBE_API_KEY = config('YOUTUBE_API_KEY', default='')
@@ -205,7 +300,91 @@ TIKTOK_ACCESS_TOKEN = config('TIKTOK_ACCESS_TOKEN', default='')
 
 # Video processing settings
 MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100MB
+MAX_VIDEO_DURATION = config('MAX_VIDEO_DURATION', default=10 * 60, cast=int)  # seconds
 SUPPORTED_VIDEO_FORMATS = ['mp4', 'avi', 'mov', 'mkv', 'webm']
+# Running upload hashes of sessions idle this long are dropped (rebuilt from disk on resume)
+UPLOAD_HASHER_IDLE_TIMEOUT = config('UPLOAD_HASHER_IDLE_TIMEOUT', default=60 * 60, cast=int)  # seconds
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+FFPROBE_BINARY = config('FFPROBE_BINARY', default='ffprobe')
+# Artifacts shared between pipeline stages (demuxed audio, source copy); must
+# be on storage every worker mounts, stages on other queues read them by path
+MEDIA_WORK_ROOT = config('MEDIA_WORK_ROOT', default=str(MEDIA_ROOT / 'work'))
+# Private per-job scratch directories; use a tmpfs mount such as /dev/shm
+# to keep intermediates in memory
+SCRATCH_ROOT = config('SCRATCH_ROOT', default='/tmp')
+SCRATCH_QUOTA = config('SCRATCH_QUOTA', default=2 * 1024 * 1024 * 1024, cast=int)  # bytes per job
+# Scratch and MEDIA_WORK_ROOT directories older than this are purged when a
+# worker starts (longer than CELERY_VISIBILITY_TIMEOUT, so no live stage loses its input)
+SCRATCH_MAX_AGE = config('SCRATCH_MAX_AGE', default=6 * 60 * 60, cast=int)  # seconds before purge
+
+# ffmpeg transcode engine
+TRANSCODE_PRESET = config('TRANSCODE_PRESET', default='veryfast')
+TRANSCODE_CRF = config('TRANSCODE_CRF', default=23, cast=int)
+TRANSCODE_THREADS = config('TRANSCODE_THREADS', default=0, cast=int)  # 0 = let ffmpeg decide
+TRANSCODE_TIMEOUT = config('TRANSCODE_TIMEOUT', default=600, cast=int)  # seconds
+TRANSCODE_MAX_HEIGHT = config('TRANSCODE_MAX_HEIGHT', default=720, cast=int)
+TRANSCODE_AUDIO_BITRATE = config('TRANSCODE_AUDIO_BITRATE', default='128k')
+# H.264 sources at or below this video bitrate (bits/s) are remuxed, not re-encoded
+REMUX_MAX_BITRATE = config('REMUX_MAX_BITRATE', default=5_000_000, cast=int)
+
+# Audio sent to transcription providers: 16kHz mono, 'opus' (small) or
+# 'flac' (lossless). Silence trimming cuts long pauses, which shortens the
+# upload but shifts timestamps relative to the video.
+TRANSCRIPTION_AUDIO_CODEC = config('TRANSCRIPTION_AUDIO_CODEC', default='opus')
+TRANSCRIPTION_AUDIO_BITRATE = config('TRANSCRIPTION_AUDIO_BITRATE', default='24k')
+TRANSCRIPTION_SAMPLE_RATE = 16000
+TRANSCRIPTION_TRIM_SILENCE = config('TRANSCRIPTION_TRIM_SILENCE', default=False, cast=bool)
+# Audio longer than TRANSCRIPTION_CHUNK_DURATION is cut at the quietest point of
+# the last TRANSCRIPTION_SPLIT_WINDOW seconds of each chunk, and the chunks
+# are transcribed concurrently
+TRANSCRIPTION_CHUNK_DURATION = config('TRANSCRIPTION_CHUNK_DURATION', default=60, cast=int)  # seconds
+TRANSCRIPTION_SPLIT_WINDOW = config('TRANSCRIPTION_SPLIT_WINDOW', default=15, cast=int)  # seconds
+TRANSCRIPTION_MAX_WORKERS = config('TRANSCRIPTION_MAX_WORKERS', default=4, cast=int)  # requests at once
+# Transcripts cached by audio fingerprint/provider/model/options; least
+# recently used entries are evicted above this size (0 disables the cache)
+TRANSCRIPTION_CACHE_MAX_BYTES = config('TRANSCRIPTION_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+# Local transcription engine (apps/ai_processing/local_engine.py), used with
+# provider='local': 'faster-whisper' (pip install faster-whisper) or 'stub'
+# (no model, for development). Empty disables it. The model is loaded once
+# per process of the workers consuming `queue` (the AI queue, see
+# CELERY_TASK_ROUTES); num_workers is the number of concurrent transcriptions
+# it accepts (match TRANSCRIPTION_MAX_WORKERS), cpu_threads per transcription.
+LOCAL_TRANSCRIPTION = {
+    'engine': config('LOCAL_TRANSCRIPTION_ENGINE', default=''),
+    'model': config('LOCAL_TRANSCRIPTION_MODEL', default='base'),
+    'device': config('LOCAL_TRANSCRIPTION_DEVICE', default='cpu'),
+    'compute_type': config('LOCAL_TRANSCRIPTION_COMPUTE_TYPE', default='int8'),
+    'cpu_threads': config('LOCAL_TRANSCRIPTION_CPU_THREADS', default=2, cast=int),
+    'num_workers': config('LOCAL_TRANSCRIPTION_WORKERS', default=2, cast=int),
+    'beam_size': config('LOCAL_TRANSCRIPTION_BEAM_SIZE', default=1, cast=int),
+    'download_root': config('LOCAL_TRANSCRIPTION_MODEL_DIR', default='') or None,
+    'queue': config('LOCAL_TRANSCRIPTION_QUEUE', default='ai'),
+}
+# Captions rendered from the stored word timestamps (apps/videos/transcripts.py):
+# at most CAPTION_MAX_CHARS characters and CAPTION_MAX_DURATION seconds per
+# cue, lines wrapped at CAPTION_LINE_LENGTH; rendered files kept in Redis
+CAPTION_MAX_CHARS = 84
+CAPTION_LINE_LENGTH = 42
+CAPTION_MAX_DURATION = 7  # seconds
+CAPTION_CACHE_TTL = config('CAPTION_CACHE_TTL', default=24 * 60 * 60, cast=int)  # seconds
+
+# Thumbnail selection: keyframes sampled and scored, sprite sheet layout
+THUMBNAIL_SAMPLE_COUNT = config('THUMBNAIL_SAMPLE_COUNT', default=24, cast=int)
+THUMBNAIL_SAMPLE_WIDTH = config('THUMBNAIL_SAMPLE_WIDTH', default=160, cast=int)
+THUMBNAIL_SPRITE_COLUMNS = config('THUMBNAIL_SPRITE_COLUMNS', default=6, cast=int)
+
+# Queued/running stages older than this are considered abandoned and no
+# longer block a new process_video run of the video
+PIPELINE_CLAIM_TIMEOUT = config('PIPELINE_CLAIM_TIMEOUT', default=2 * 60 * 60, cast=int)  # seconds
+
+# Adaptive-bitrate HLS renditions: (height, video bitrate in bits/s)
+HLS_ENABLED = config('HLS_ENABLED', default=True, cast=bool)
+HLS_LADDER = [
+    (240, 400_000),
+    (480, 1_000_000),
+    (720, 2_500_000),
+]
+HLS_SEGMENT_DURATION = config('HLS_SEGMENT_DURATION', default=4, cast=int)  # seconds
 
 # Security settings for production
 if not DEBUG: